@@ -0,0 +1,74 @@
+"""
+Benchmark the blocked near-duplicate pass against the original pairwise loop.
+
+Usage:
+    python -m modules.dedupe.bench --sizes 1000 10000 50000 --loop-max 10000
+
+Uses random normalized embeddings (384-d, the all-MiniLM-L6-v2 width) with a
+share of planted near-duplicates, so no model download is needed. The pairwise
+loop is skipped above --loop-max because it is quadratic interpreted work.
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+
+def _pairwise_loop(emb: np.ndarray, threshold: float) -> List[int]:
+    keep = []
+    used = set()
+    for i in range(len(emb)):
+        if i in used:
+            continue
+        keep.append(i)
+        for j in range(i + 1, len(emb)):
+            if j in used:
+                continue
+            sim = float(np.dot(emb[i], emb[j]))
+            if sim >= threshold:
+                used.add(j)
+    return keep
+
+
+def _synthetic_embeddings(n: int, dim: int = 384, dup_ratio: float = 0.2, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((n, dim)).astype(np.float32)
+    n_dup = int(n * dup_ratio)
+    if n_dup and n > 1:
+        src = rng.integers(0, n, n_dup)
+        dst = rng.integers(0, n, n_dup)
+        emb[dst] = emb[src] + 0.05 * rng.standard_normal((n_dup, dim)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    return emb
+
+
+def main():
+    from .dedupe import near_duplicate_graph
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--threshold', type=float, default=0.92)
+    parser.add_argument('--block-size', type=int, default=1024)
+    parser.add_argument('--loop-max', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'n':>8} {'blocked_s':>10} {'loop_s':>10} {'speedup':>8} {'kept':>8} {'match':>6}")
+    for n in args.sizes:
+        emb = _synthetic_embeddings(n)
+
+        t0 = time.perf_counter()
+        kept, _ = near_duplicate_graph(emb, args.threshold, args.block_size)
+        blocked_s = time.perf_counter() - t0
+
+        if n <= args.loop_max:
+            t0 = time.perf_counter()
+            expected = _pairwise_loop(emb, args.threshold)
+            loop_s = time.perf_counter() - t0
+            print(f"{n:>8} {blocked_s:>10.3f} {loop_s:>10.3f} {loop_s / blocked_s:>7.1f}x {len(kept):>8} {str(kept == expected):>6}")
+        else:
+            print(f"{n:>8} {blocked_s:>10.3f} {'skipped':>10} {'-':>8} {len(kept):>8} {'-':>6}")
+
+
+if __name__ == '__main__':
+    main()
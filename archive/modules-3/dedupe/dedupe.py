@@ -1,29 +1,115 @@
-from typing import List, Tuple
-from sentence_transformers import SentenceTransformer
+from typing import Dict, List, Tuple
 import numpy as np
+from .embedding_cache import get_embedding_cache
+from ..utils.metrics import timed
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
 
 _model = None
 def _load_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        # Imported here so that importing dedupe does not load torch.
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(MODEL_NAME)
     return _model
 
-def remove_near_duplicates(chunks: List[str], threshold: float = 0.92) -> List[str]:
-    if not chunks:
-        return []
-    model = _load_model()
-    emb = model.encode(chunks, normalize_embeddings=True)
-    keep = []
-    used = set()
-    for i in range(len(chunks)):
-        if i in used: 
+def embed_chunks(chunks: List[str], use_cache: bool = True) -> np.ndarray:
+    """Normalized embeddings for `chunks`; with use_cache only unseen text reaches the model."""
+    def encode(texts):
+        return _load_model().encode(texts, normalize_embeddings=True)
+
+    if not use_cache:
+        return encode(chunks)
+    return get_embedding_cache(MODEL_NAME).get_or_compute(chunks, encode)
+
+def near_duplicate_graph(
+    emb: np.ndarray,
+    threshold: float = 0.92,
+    block_size: int = 1024
+) -> Tuple[List[int], Dict[int, int]]:
+    """
+    Greedy keep-first near-duplicate resolution over normalized embeddings.
+
+    Rows are processed in order: a row that has not been absorbed is kept and
+    absorbs every later row whose cosine similarity is >= threshold. Similarities
+    are computed as block_size x block_size matrix products, so peak extra
+    memory is O(block_size^2) regardless of the number of rows.
+
+    Returns:
+        (kept_indices, absorbed_by) where absorbed_by maps each dropped row
+        index to the index of the kept row that absorbed it.
+    """
+    emb = np.ascontiguousarray(emb, dtype=np.float32)
+    n = emb.shape[0]
+    block_size = max(1, int(block_size))
+
+    absorbed = np.zeros(n, dtype=bool)
+    absorbed_by: Dict[int, int] = {}
+    kept: List[int] = []
+
+    for b0 in range(0, n, block_size):
+        b1 = min(b0 + block_size, n)
+
+        # Resolve the diagonal block sequentially: keep/absorb decisions inside
+        # a block depend on earlier rows of the same block.
+        sims = emb[b0:b1] @ emb[b0:b1].T
+        block_kept = []
+        for r in range(b1 - b0):
+            i = b0 + r
+            if absorbed[i]:
+                continue
+            kept.append(i)
+            block_kept.append(i)
+            hits = np.flatnonzero(sims[r, r + 1:] >= threshold) + (i + 1)
+            hits = hits[~absorbed[hits]]
+            absorbed[hits] = True
+            for j in hits.tolist():
+                absorbed_by[j] = i
+
+        if not block_kept or b1 == n:
             continue
-        keep.append(chunks[i])
-        for j in range(i+1, len(chunks)):
-            if j in used: 
+
+        # Kept rows of this block absorb later rows; the earliest kept row wins,
+        # matching the order of the original pairwise loop.
+        kept_rows = emb[block_kept]
+        for c0 in range(b1, n, block_size):
+            c1 = min(c0 + block_size, n)
+            live = np.flatnonzero(~absorbed[c0:c1])
+            if live.size == 0:
                 continue
-            sim = float(np.dot(emb[i], emb[j]))
-            if sim >= threshold:
-                used.add(j)
-    return keep
+            hit = (kept_rows @ emb[c0 + live].T) >= threshold
+            any_hit = hit.any(axis=0)
+            if not any_hit.any():
+                continue
+            first = hit.argmax(axis=0)
+            cols = c0 + live[any_hit]
+            absorbed[cols] = True
+            for j, k in zip(cols.tolist(), first[any_hit].tolist()):
+                absorbed_by[j] = block_kept[k]
+
+    return kept, absorbed_by
+
+def find_near_duplicates(
+    chunks: List[str],
+    threshold: float = 0.92,
+    block_size: int = 1024,
+    use_cache: bool = True
+) -> Tuple[List[int], Dict[int, int]]:
+    """Embed `chunks` and return near_duplicate_graph() over them for auditing merges."""
+    if not chunks:
+        return [], {}
+    emb = embed_chunks(chunks, use_cache)
+    return near_duplicate_graph(emb, threshold, block_size)
+
+@timed('dedupe_embedding', size=lambda chunks, *args, **kwargs: len(chunks))
+def remove_near_duplicates(
+    chunks: List[str],
+    threshold: float = 0.92,
+    block_size: int = 1024,
+    use_cache: bool = True
+) -> List[str]:
+    if not chunks:
+        return []
+    kept, _ = find_near_duplicates(chunks, threshold, block_size, use_cache)
+    return [chunks[i] for i in kept]
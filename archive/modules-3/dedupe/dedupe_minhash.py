@@ -0,0 +1,186 @@
+import json
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from ..utils import metrics
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHashDeduper:
+    """
+    Streaming near-duplicate filter based on MinHash + LSH banding.
+
+    Chunks are shingled into character n-grams and reduced to a fixed-size
+    MinHash signature, so no chunk text or embedding has to stay in memory.
+    Candidates come from LSH band buckets and are confirmed when the estimated
+    Jaccard similarity reaches the threshold.
+
+    With index_dir set, signatures are loaded on construction and written back
+    by save(), so each new batch is deduplicated against every earlier run.
+
+    Args:
+        threshold: Estimated Jaccard similarity (0-1) at which a chunk counts as a duplicate
+        num_perm: Number of hash permutations in each signature
+        bands: Number of LSH bands; num_perm must be divisible by it
+        shingle_size: Character n-gram length used for shingling
+        index_dir: Directory holding the persisted index (optional)
+        seed: Seed for the permutation parameters; stored with the index
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+        index_dir: Optional[str] = None,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.index_dir = index_dir
+        self.seed = seed
+
+        if index_dir and os.path.exists(os.path.join(index_dir, 'meta.json')):
+            self._load_meta()
+
+        rng = np.random.RandomState(self.seed)
+        self._a = rng.randint(1, (1 << 32) - 1, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 32) - 1, size=self.num_perm, dtype=np.uint64)
+
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bands)]
+
+        if index_dir and os.path.exists(os.path.join(index_dir, 'signatures.npy')):
+            self._load_signatures()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        norm = re.sub(r'\s+', ' ', text).strip().lower()
+        k = self.shingle_size
+        if len(norm) <= k:
+            shingles = {norm}
+        else:
+            shingles = {norm[i:i + k] for i in range(len(norm) - k + 1)}
+        hv = np.fromiter(
+            (zlib.crc32(s.encode('utf-8')) for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        # a and hv are both below 2**32, so a * hv + b cannot overflow uint64.
+        phv = ((np.outer(hv, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return phv.min(axis=0).astype(np.uint32)
+
+    def is_duplicate(self, sig: np.ndarray) -> bool:
+        seen = set()
+        for band, key in enumerate(self._band_keys(sig)):
+            for idx in self._buckets[band].get(key, ()):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                if np.mean(self._signatures[idx] == sig) >= self.threshold:
+                    return True
+        return False
+
+    def add(self, sig: np.ndarray) -> int:
+        idx = len(self._signatures)
+        self._signatures.append(sig)
+        for band, key in enumerate(self._band_keys(sig)):
+            self._buckets[band][key].append(idx)
+        return idx
+
+    def stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Yield each chunk that is not a near-duplicate of anything seen so far."""
+        for chunk in chunks:
+            sig = self.signature(chunk)
+            if self.is_duplicate(sig):
+                continue
+            self.add(sig)
+            yield chunk
+
+    def save(self):
+        if not self.index_dir:
+            raise ValueError("MinHashDeduper was created without index_dir")
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        sig_path = os.path.join(self.index_dir, 'signatures.npy')
+        tmp_path = sig_path + '.tmp.npy'
+        if self._signatures:
+            matrix = np.vstack(self._signatures)
+        else:
+            matrix = np.empty((0, self.num_perm), dtype=np.uint32)
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, sig_path)
+
+        meta = {
+            'num_perm': self.num_perm,
+            'bands': self.bands,
+            'shingle_size': self.shingle_size,
+            'seed': self.seed,
+            'count': len(self._signatures)
+        }
+        with open(os.path.join(self.index_dir, 'meta.json'), 'w', encoding='utf-8') as fp:
+            json.dump(meta, fp)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        r = self.rows
+        return [sig[b * r:(b + 1) * r].tobytes() for b in range(self.bands)]
+
+    def _load_meta(self):
+        with open(os.path.join(self.index_dir, 'meta.json'), 'r', encoding='utf-8') as fp:
+            meta = json.load(fp)
+        # Signatures are only comparable under the parameters they were built with.
+        self.num_perm = meta['num_perm']
+        self.bands = meta['bands']
+        self.rows = self.num_perm // self.bands
+        self.shingle_size = meta['shingle_size']
+        self.seed = meta['seed']
+
+    def _load_signatures(self):
+        matrix = np.load(os.path.join(self.index_dir, 'signatures.npy'))
+        for sig in matrix:
+            self.add(sig)
+
+
+def remove_near_duplicates_minhash(
+    chunks: Iterable[str],
+    threshold: float = 0.8,
+    index_dir: Optional[str] = None
+) -> List[str]:
+    """
+    MinHash/LSH based deduplication (streaming, no embeddings).
+
+    Args:
+        chunks: Iterable of text chunks; may be a generator
+        threshold: Estimated Jaccard similarity (0-1) at which chunks are duplicates
+        index_dir: If set, dedupe against the index persisted there and save it afterwards
+
+    Returns:
+        List of unique chunks, in input order
+    """
+    with metrics.stage('dedupe_minhash'):
+        deduper = MinHashDeduper(threshold=threshold, index_dir=index_dir)
+        before = len(deduper)
+        unique_chunks = list(deduper.stream(chunks))
+        if index_dir:
+            deduper.save()
+    metrics.observe('pipeline_stage_size', len(unique_chunks), {'stage': 'dedupe_minhash'})
+
+    print(f"[DEDUPE MINHASH] Kept {len(unique_chunks)} new chunks ({threshold*100:.0f}% threshold, index {before} -> {len(deduper)})")
+
+    return unique_chunks
@@ -1,24 +1,56 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+import os
+import sys
+import threading
+from typing import Optional
+from ..utils import metrics
+from ..utils.metrics import timed
 
-def remove_near_duplicates_tfidf(chunks: list, threshold: float = 0.92) -> list:
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# Above this many chunks "auto" mode switches from the dense N x N similarity
+# matrix to blocked sparse products.
+DENSE_MAX_CHUNKS = 2000
+
+@timed('dedupe_tfidf', size=lambda chunks, *args, **kwargs: len(chunks))
+def remove_near_duplicates_tfidf(
+    chunks: list,
+    threshold: float = 0.92,
+    mode: str = "auto",
+    block_size: int = 1024
+) -> list:
     """
     TF-IDF based deduplication (lightweight alternative to embeddings).
-    
+
     Uses scikit-learn's TF-IDF vectorizer instead of sentence-transformers,
     making it suitable for Autoscale environments where PyTorch is not available.
-    
+
     Args:
         chunks: List of text chunks to deduplicate
         threshold: Similarity threshold (0-1). Chunks above this are considered duplicates.
-    
+        mode: "dense" builds the full N x N similarity matrix, "sparse" multiplies
+            block_size rows at a time and keeps only pairs above the threshold,
+            so memory stays roughly linear in N. "auto" picks sparse above
+            DENSE_MAX_CHUNKS chunks.
+        block_size: Rows per sparse product in "sparse" mode
+
     Returns:
-        List of unique chunks with duplicates removed
+        List of unique chunks with duplicates removed. The peak memory the call
+        used (above the process's resident size when it started) is printed
+        and recorded as the dedupe_peak_rss_megabytes{mode} metric.
     """
     if len(chunks) <= 1:
         return chunks
-    
+
+    if mode == "auto":
+        mode = "sparse" if len(chunks) > DENSE_MAX_CHUNKS else "dense"
+    if mode not in ("dense", "sparse"):
+        raise ValueError(f"Unknown mode: {mode}")
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
     vectorizer = TfidfVectorizer(
         max_features=1000,
         ngram_range=(1, 2),
@@ -26,30 +58,141 @@ def remove_near_duplicates_tfidf(chunks: list, threshold: float = 0.92) -> list:
         max_df=0.95,
         sublinear_tf=True
     )
-    
+
+    with PeakRss() as peak:
+        try:
+            tfidf_matrix = vectorizer.fit_transform(chunks)
+        except ValueError:
+            return chunks
+
+        if mode == "dense":
+            rows, cols = _dense_pairs(tfidf_matrix, threshold)
+        else:
+            rows, cols = _sparse_pairs(tfidf_matrix, threshold, block_size)
+        del tfidf_matrix
+
+        keep_mask = _drop_shorter(rows, cols, chunks)
+
+    unique_chunks = [chunk for idx, chunk in enumerate(chunks) if keep_mask[idx]]
+
+    metrics.observe('dedupe_peak_rss_megabytes', peak.megabytes, {'mode': mode})
+    print(f"[DEDUPE TF-IDF] Reduced from {len(chunks)} to {len(unique_chunks)} chunks ({threshold*100:.0f}% threshold, {mode}, peak memory +{peak.megabytes:.1f} MB)")
+
+    return unique_chunks
+
+def _current_rss() -> Optional[int]:
+    """Current resident set size in bytes, or None without /proc (non-Linux)."""
     try:
-        tfidf_matrix = vectorizer.fit_transform(chunks)
-    except ValueError:
-        return chunks
-    
+        with open('/proc/self/statm', 'rb') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _lifetime_peak_rss() -> int:
+    """Process-lifetime peak resident set size in bytes (0 where the platform does not report it)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class PeakRss:
+    """
+    Peak resident memory used by a block, above the resident size at entry.
+
+    A daemon thread samples /proc/self/statm every `interval` seconds. A peak
+    between two samples (e.g. inside one C call that holds the GIL) is still
+    caught whenever it is a new process-lifetime high, because ru_maxrss is
+    read at exit too. Without /proc only the ru_maxrss increase is available,
+    which is 0 if the block stayed below an earlier peak of the process.
+    Unlike tracemalloc this adds no per-allocation overhead.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def megabytes(self) -> float:
+        return self.bytes / (1024 * 1024)
+
+    def __enter__(self) -> 'PeakRss':
+        self._lifetime_start = _lifetime_peak_rss()
+        current = _current_rss()
+        self._start = current if current is not None else self._lifetime_start
+        self._peak = self._start
+        if current is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _current_rss() or 0)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._peak = max(self._peak, _current_rss() or 0)
+        lifetime_end = _lifetime_peak_rss()
+        if lifetime_end > self._lifetime_start:
+            self._peak = max(self._peak, lifetime_end)
+        self.bytes = max(0, self._peak - self._start)
+        return False
+
+def _dense_pairs(tfidf_matrix, threshold: float):
+    from sklearn.metrics.pairwise import cosine_similarity
     similarities = cosine_similarity(tfidf_matrix)
-    
+    return np.nonzero(np.triu(similarities >= threshold, k=1))
+
+def _sparse_pairs(tfidf_matrix, threshold: float, block_size: int):
+    """Upper-triangle (i, j) pairs with similarity >= threshold, in row-major order."""
+    # TfidfVectorizer rows are L2-normalized, so X @ X.T is the cosine similarity.
+    X = tfidf_matrix.tocsr()
+    n = X.shape[0]
+    rows, cols = [], []
+    for b0 in range(0, n, max(1, int(block_size))):
+        b1 = min(b0 + block_size, n)
+        # Only columns >= b0 can hold upper-triangle pairs for these rows.
+        block = (X[b0:b1] @ X[b0:].T).tocoo()
+        mask = (block.data >= threshold) & (block.col > block.row)
+        if not mask.any():
+            continue
+        r = block.row[mask] + b0
+        c = block.col[mask] + b0
+        order = np.lexsort((c, r))
+        rows.append(r[order])
+        cols.append(c[order])
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(rows), np.concatenate(cols)
+
+def _drop_shorter(rows: np.ndarray, cols: np.ndarray, chunks: list) -> np.ndarray:
+    """
+    Replay the original pairwise walk over the above-threshold pairs only.
+
+    For each pair (i, j) visited in row-major order, where i was still kept when
+    its row started and j is still kept, the shorter chunk is dropped.
+    """
     keep_mask = np.ones(len(chunks), dtype=bool)
-    
-    for i in range(len(chunks)):
-        if not keep_mask[i]:
+    if len(rows) == 0:
+        return keep_mask
+
+    lengths = np.fromiter((len(c) for c in chunks), dtype=np.int64, count=len(chunks))
+    shorter = np.where(lengths[rows] < lengths[cols], rows, cols)
+
+    current_row = -1
+    row_alive = False
+    for i, j, s in zip(rows.tolist(), cols.tolist(), shorter.tolist()):
+        if i != current_row:
+            current_row = i
+            row_alive = keep_mask[i]
+        if not row_alive or not keep_mask[j]:
             continue
-        
-        for j in range(i + 1, len(chunks)):
-            if not keep_mask[j]:
-                continue
-            
-            if similarities[i, j] >= threshold:
-                shorter_idx = i if len(chunks[i]) < len(chunks[j]) else j
-                keep_mask[shorter_idx] = False
-    
-    unique_chunks = [chunk for idx, chunk in enumerate(chunks) if keep_mask[idx]]
-    
-    print(f"[DEDUPE TF-IDF] Reduced from {len(chunks)} to {len(unique_chunks)} chunks ({threshold*100:.0f}% threshold)")
-    
-    return unique_chunks
+        keep_mask[s] = False
+
+    return keep_mask
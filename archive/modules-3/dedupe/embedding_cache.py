@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache is only safe within one process
+    fcntl = None
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def text_key(text: str) -> str:
+    """Cache key for a text: sha256 of its whitespace-normalized form."""
+    return hashlib.sha256(_normalize(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one model, keyed by content hash.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32) and a JSON
+    index maps each text hash to its row slot and last-use tick. When the cache
+    holds more than max_entries vectors, the least recently used rows are
+    evicted and their slots reused.
+
+    Each flush appends one line with the entries set or evicted since the last
+    flush to index.log; the full index.json snapshot is only rewritten once the
+    log holds more records than the index has entries, so a flush costs
+    O(batch) amortized rather than O(entries).
+
+    Several processes may share one cache directory (the pipeline runner's
+    dedupe workers do): every lookup and store holds an flock on index.lock
+    and first applies the log records other processes appended since, so slot
+    allocation and log appends never interleave.
+
+    Args:
+        model_name: Embedding model identifier; each model gets its own subdirectory
+        cache_dir: Root directory for all embedding caches
+        max_entries: Maximum number of cached vectors before LRU eviction
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str = "export/.cache/embeddings",
+        max_entries: int = 200_000
+    ):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.directory = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._reset()
+        # index.json as last read or written by this process (stat signature); the
+        # first _refresh() always loads, since the files are only read under the lock.
+        self._snapshot_sig: object = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, 'index.json')
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.directory, 'index.log')
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, 'vectors.f32')
+
+    def get_or_compute(
+        self,
+        texts: Sequence[str],
+        encode_fn: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Return embeddings for `texts`, calling encode_fn only for texts that are
+        not cached yet. The new vectors are stored and flushed to disk.
+        """
+        keys = [text_key(t) for t in texts]
+
+        # Hit vectors are copied out under the same lock that finds them: once
+        # it is released, another thread's or process's eviction may reuse their slots.
+        hit_rows: List[int] = []
+        hit_slots: List[int] = []
+        missing: Dict[str, List[int]] = {}
+        miss_texts: List[str] = []
+        with self._locked():
+            self._refresh()
+            self._tick += 1
+            for row, (key, text) in enumerate(zip(keys, texts)):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry[1] = self._tick
+                    self._pending_set[key] = entry
+                    hit_rows.append(row)
+                    hit_slots.append(entry[0])
+                    self.hits += 1
+                else:
+                    if key not in missing:
+                        missing[key] = []
+                        miss_texts.append(text)
+                    missing[key].append(row)
+                    self.misses += 1
+            hit_vectors = self._vectors[hit_slots] if hit_slots else None
+            # Persist the hits' new ticks, so LRU order survives hit-only batches.
+            self._flush()
+
+        new_vectors = None
+        if missing:
+            new_vectors = np.asarray(encode_fn(miss_texts), dtype=np.float32)
+            with self._locked():
+                self._refresh()
+                self._store(list(missing), new_vectors)
+                self._flush()
+
+        dim = hit_vectors.shape[1] if hit_vectors is not None else (new_vectors.shape[1] if new_vectors is not None else 0)
+        out = np.empty((len(keys), dim), dtype=np.float32)
+        if hit_vectors is not None:
+            out[hit_rows] = hit_vectors
+        if new_vectors is not None:
+            for vec, rows in zip(new_vectors, missing.values()):
+                out[rows] = vec
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize index and vector updates across threads and worker processes."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # Opened per call: a descriptor inherited across fork() would share the lock.
+            with open(os.path.join(self.directory, 'index.lock'), 'a') as fp:
+                if fcntl is not None:
+                    fcntl.flock(fp, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fp, fcntl.LOCK_UN)
+
+    def _store(self, keys: List[str], vectors: np.ndarray):
+        if self._dim is None:
+            self._dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Embedding dimension changed for {self.model_name}: {vectors.shape[1]} != {self._dim}")
+
+        overflow = len(self._entries) + len(keys) - self.max_entries
+        if overflow > 0:
+            self._evict(overflow)
+
+        self._tick += 1
+        for key, vec in zip(keys, vectors):
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Stored by another thread or process while this batch was being encoded.
+                slot = entry[0]
+            elif self._free:
+                slot = self._free.pop()
+            else:
+                slot = self._next_slot
+                self._next_slot += 1
+                if slot >= self._capacity:
+                    self._grow(max(1024, self._capacity * 2, slot + 1))
+            self._vectors[slot] = vec
+            self._vectors_dirty = True
+            entry = self._entries[key] = [slot, self._tick]
+            self._pending_set[key] = entry
+            self._pending_del.discard(key)
+
+    def _evict(self, count: int):
+        # Evict a little more than needed so eviction is not paid on every store.
+        count = min(len(self._entries), count + self.max_entries // 10)
+        oldest = sorted(self._entries.items(), key=lambda kv: kv[1][1])[:count]
+        for key, (slot, _) in oldest:
+            del self._entries[key]
+            self._free.add(slot)
+            self._pending_set.pop(key, None)
+            self._pending_del.add(key)
+
+    def _grow(self, capacity: int):
+        # Extended in place, so other processes' mappings of the file stay valid;
+        # they re-map the larger file when they replay the log line carrying it.
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._vectors_path, 'ab'):
+            pass
+        os.truncate(self._vectors_path, capacity * self._dim * 4)
+        self._capacity = capacity
+        self._map_vectors()
+
+    def _map_vectors(self):
+        if not self._capacity or self._dim is None:
+            self._vectors = None
+        elif self._vectors is None or self._vectors.shape != (self._capacity, self._dim):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(self._capacity, self._dim))
+
+    def _flush(self):
+        if self._vectors_dirty:
+            self._vectors.flush()
+            self._vectors_dirty = False
+        if not self._pending_set and not self._pending_del:
+            return
+        records = len(self._pending_set) + len(self._pending_del)
+        if self._log_records + records > max(1024, len(self._entries)):
+            self._write_snapshot()
+        else:
+            line = {
+                'dim': self._dim,
+                'capacity': self._capacity,
+                'next_slot': self._next_slot,
+                'tick': self._tick,
+                'set': self._pending_set,
+                'del': sorted(self._pending_del)
+            }
+            with open(self._log_path, 'a+b') as fp:
+                fp.seek(0, os.SEEK_END)
+                if fp.tell():
+                    # Start on a fresh line if a crashed writer left a torn one.
+                    fp.seek(-1, os.SEEK_END)
+                    if fp.read(1) != b'\n':
+                        fp.write(b'\n')
+                fp.write(json.dumps(line).encode('utf-8') + b'\n')
+                self._log_offset = fp.tell()
+            self._log_records += records
+        self._pending_set, self._pending_del = {}, set()
+
+    def _write_snapshot(self):
+        index = {
+            'model_name': self.model_name,
+            'dim': self._dim,
+            'capacity': self._capacity,
+            'next_slot': self._next_slot,
+            'tick': self._tick,
+            'entries': self._entries
+        }
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(index, fp)
+        os.replace(tmp_path, self._index_path)
+        # The snapshot now covers everything in the log.
+        with open(self._log_path, 'w', encoding='utf-8'):
+            pass
+        self._snapshot_sig = self._stat_sig(self._index_path)
+        self._log_offset = 0
+        self._log_records = 0
+
+    def _reset(self):
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._tick = 0
+        self._entries: Dict[str, List[int]] = {}
+        self._free: Set[int] = set()
+        self._next_slot = 0
+        self._vectors: Optional[np.memmap] = None
+        self._vectors_dirty = False
+        # Changes not yet written to index.log (never kept past the lock), the
+        # log position read up to, and records in the log since the last snapshot.
+        self._pending_set: Dict[str, List[int]] = {}
+        self._pending_del: set = set()
+        self._log_offset = 0
+        self._log_records = 0
+
+    @staticmethod
+    def _stat_sig(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        """Catch up with changes other processes made; call with the lock held."""
+        if self._stat_sig(self._index_path) != self._snapshot_sig:
+            self._load()
+            return
+        try:
+            log_size = os.path.getsize(self._log_path)
+        except OSError:
+            log_size = 0
+        if log_size < self._log_offset:
+            self._load()
+        elif log_size > self._log_offset:
+            self._replay_log()
+            self._map_vectors()
+
+    def _load(self):
+        self._reset()
+        self._snapshot_sig = self._stat_sig(self._index_path)
+        try:
+            # Before the first snapshot, the log alone describes the cache.
+            if self._snapshot_sig is not None:
+                with open(self._index_path, 'r', encoding='utf-8') as fp:
+                    index = json.load(fp)
+                self._dim = index['dim']
+                self._capacity = index['capacity']
+                self._next_slot = index['next_slot']
+                self._tick = index['tick']
+                self._entries = index['entries']
+            self._replay_log()
+            self._map_vectors()
+        except Exception as e:
+            print(f"[EMBED CACHE] Ignoring unreadable cache in {self.directory}: {e}")
+            offset = self._log_offset
+            self._reset()
+            # Only records appended after this point are replayed later.
+            self._log_offset = offset
+            return
+        used = {slot for slot, _ in self._entries.values()}
+        self._free = {slot for slot in range(self._next_slot) if slot not in used}
+
+    def _replay_log(self):
+        """
+        Apply index.log records past the last offset read. A torn line (crash
+        mid-write) is skipped; an unterminated tail is left for the next read.
+        """
+        try:
+            with open(self._log_path, 'rb') as fp:
+                fp.seek(self._log_offset)
+                data = fp.read()
+        except FileNotFoundError:
+            return
+        complete = data.rfind(b'\n') + 1
+        for line in data[:complete].splitlines():
+            try:
+                change = json.loads(line)
+            except ValueError:
+                continue
+            for key in change['del']:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._free.add(entry[0])
+            for key, entry in change['set'].items():
+                old = self._entries.get(key)
+                if old is not None and old[0] != entry[0]:
+                    self._free.add(old[0])
+                self._free.discard(entry[0])
+                self._entries[key] = entry
+            self._dim = change['dim']
+            self._capacity = change['capacity']
+            self._next_slot = change['next_slot']
+            self._tick = change['tick']
+            self._log_records += len(change['set']) + len(change['del'])
+        self._log_offset += complete
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, cache_dir: str = "export/.cache/embeddings") -> EmbeddingCache:
+    """Process-wide EmbeddingCache per (cache_dir, model_name)."""
+    key = os.path.join(cache_dir, model_name)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(model_name, cache_dir=cache_dir)
+        return _caches[key]
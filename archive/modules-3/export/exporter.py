@@ -1,7 +1,7 @@
-from docx import Document
 from pathlib import Path
 
 def export_docx(text: str, out_path: str):
+    from docx import Document
     doc = Document()
     for para in text.split('\n\n'):
         doc.add_paragraph(para)
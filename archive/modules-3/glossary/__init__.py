@@ -1 +1 @@
-from .glossary import apply_glossary
+from .glossary import apply_glossary, apply_many, load_glossary, Glossary
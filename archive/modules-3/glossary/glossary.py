@@ -1,63 +1,150 @@
-import pandas as pd
+import os
 import re
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from ..utils.metrics import timed
 
+
+class Glossary:
+    """
+    Compiled glossary for a single language.
+
+    All terms are folded into one alternation regex (longest term first), so a
+    document is rewritten in a single left-to-right pass. A replacement is never
+    re-scanned, which means one term's output can no longer be rewritten by a
+    later glossary row.
+    """
+
+    def __init__(self, pairs: List[Tuple[str, str]], lang: str):
+        self.lang = lang
+        self._targets: Dict[str, str] = {}
+        for source_term, target_term in pairs:
+            if not source_term or source_term == target_term:
+                continue
+            self._targets.setdefault(source_term.lower(), target_term)
+
+        if self._targets:
+            terms = sorted(self._targets, key=len, reverse=True)
+            self._pattern = re.compile(
+                r'\b(?:' + '|'.join(map(re.escape, terms)) + r')\b',
+                flags=re.IGNORECASE
+            )
+        else:
+            self._pattern = None
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def apply(self, text: str) -> Tuple[str, int]:
+        """Return the rewritten text and the number of replacements made."""
+        if self._pattern is None or not text:
+            return text, 0
+
+        count = 0
+
+        def _replace(m):
+            nonlocal count
+            target = self._targets.get(m.group(0).lower())
+            if target is None:
+                return m.group(0)
+            count += 1
+            return target
+
+        return self._pattern.sub(_replace, text), count
+
+
+_cache: Dict[Tuple[str, str], Tuple[float, Glossary]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_glossary(lang: str = 'EN', glossary_path: str = 'catalog/Glossary.csv') -> Optional[Glossary]:
+    """
+    Return the compiled glossary for `lang`, rebuilding it only when the CSV
+    file's mtime changes. Returns None if the file is missing or unusable.
+    """
+    lang_col = lang.upper()[:2]
+
+    try:
+        mtime = os.stat(glossary_path).st_mtime
+    except OSError:
+        print(f"[GLOSSARY] File not found: {glossary_path}, skipping")
+        return None
+
+    key = (str(Path(glossary_path).resolve()), lang_col)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    from ..utils.catalog import load_catalog
+    try:
+        catalog = load_catalog(glossary_path)
+    except Exception as e:
+        print(f"[GLOSSARY] Error reading file: {e}")
+        return None
+
+    if not catalog.has_column('Term') or not catalog.has_column(lang_col):
+        print(f"[GLOSSARY] Missing required columns (Term or {lang_col})")
+        return None
+
+    glossary = Glossary(catalog.term_pairs('Term', lang_col), lang_col)
+
+    with _cache_lock:
+        _cache[key] = (mtime, glossary)
+
+    return glossary
+
+
+@timed('apply_glossary', size=lambda text, *args, **kwargs: len(text))
 def apply_glossary(text: str, lang: str = 'EN', glossary_path: str = 'catalog/Glossary.csv') -> str:
     """
     Apply glossary term replacements to text.
-    
+
     This is a mandatory step after rewriting to ensure consistent terminology
     across all documents in the specified language.
-    
+
     Args:
         text: The text to process
         lang: Language code (AR, EN, or DE)
         glossary_path: Path to glossary CSV file
-    
+
     Returns:
         Text with glossary replacements applied
-    
+
     CSV Format:
         Term,AR,EN,DE,Category
         product,منتج,product,Produkt,general
         hair,شعر,hair,Haar,technical
     """
-    if not Path(glossary_path).exists():
-        print(f"[GLOSSARY] File not found: {glossary_path}, skipping")
-        return text
-    
-    try:
-        df = pd.read_csv(glossary_path)
-    except Exception as e:
-        print(f"[GLOSSARY] Error reading file: {e}")
-        return text
-    
-    lang_col = lang.upper()[:2]
-    
-    if 'Term' not in df.columns or lang_col not in df.columns:
-        print(f"[GLOSSARY] Missing required columns (Term or {lang_col})")
+    glossary = load_glossary(lang, glossary_path)
+    if glossary is None:
         return text
-    
-    replacements_made = 0
-    
-    for _, row in df.iterrows():
-        source_term = str(row['Term']).strip()
-        target_term = str(row[lang_col]).strip()
-        
-        if pd.isna(source_term) or pd.isna(target_term):
-            continue
-        
-        if source_term == target_term:
-            continue
-        
-        pattern = r'\b' + re.escape(source_term) + r'\b'
-        
-        new_text = re.sub(pattern, target_term, text, flags=re.IGNORECASE)
-        
-        if new_text != text:
-            replacements_made += 1
-            text = new_text
-    
+
+    text, replacements_made = glossary.apply(text)
+
     print(f"[GLOSSARY] Applied {replacements_made} term replacements for {lang}")
-    
+
     return text
+
+
+@timed('apply_glossary_many', size=lambda texts, *args, **kwargs: len(texts))
+def apply_many(texts: List[str], lang: str = 'EN', glossary_path: str = 'catalog/Glossary.csv') -> List[str]:
+    """
+    Batch variant of apply_glossary: the glossary is resolved once and applied
+    to every text in order.
+    """
+    glossary = load_glossary(lang, glossary_path)
+    if glossary is None:
+        return list(texts)
+
+    out = []
+    replacements_made = 0
+    for text in texts:
+        new_text, count = glossary.apply(text)
+        out.append(new_text)
+        replacements_made += count
+
+    print(f"[GLOSSARY] Applied {replacements_made} term replacements across {len(out)} texts for {lang}")
+
+    return out
@@ -1,25 +1,95 @@
 import re
 from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator
 from unidecode import unidecode
+from ..utils.metrics import timed
 
+# All normalization rules as one alternation, applied in a single scan:
+#   date   DD/MM/YYYY or DD-MM-YYYY -> YYYY-MM-DD
+#   punct  whitespace before , ; : . % is dropped (a comma that ends up
+#          between two digits becomes a decimal point)
+#   spaces runs of spaces/tabs -> ' ', runs of 3+ newlines -> '\n\n'
+#   comma  comma between two digits -> '.'
+# The alternatives start with disjoint characters (digit, whitespace, comma)
+# and "punct" is tried before "spaces", so this gives exactly the result of
+# applying the rules one after another. The leading lookahead is a cheap
+# necessary condition for any alternative, so ordinary text is skipped
+# without trying each branch.
+_FUSED = re.compile(
+    r'(?=\d[\-/\d]|\s[\s,;:.%]|\t|,\d)(?:'
+    r'(?P<date>\b(\d{1,2})[\-/](\d{1,2})[\-/](\d{2,4})\b)'
+    r'|(?P<punct>\s+([,;:.%]))'
+    r'|(?P<spaces>[ \t]{2,}|\t)'
+    r'|(?P<newlines>\n{3,})'
+    r'|(?P<comma>(?<=\d),(?=\d))'
+    r')'
+)
+_LAST_BOUNDARY = re.compile(r'.*\S(?=\s)', re.DOTALL)
+
+@timed('normalize_text', size=len)
 def normalize_text(s: str) -> str:
-    # unify whitespace
-    s = re.sub(r'[ \t]+', ' ', s)
-    s = re.sub(r'\n{3,}', '\n\n', s)
-    # unify punctuation spacing
-    s = re.sub(r'\s+([,;:.%])', r'\1', s)
-    # unify decimals: replace commas between digits with dot
-    s = re.sub(r'(?<=\d),(?=\d)', '.', s)
-    # unify percent spacing
-    s = re.sub(r'\s*%','%', s)
-    # normalize dates like DD/MM/YYYY -> YYYY-MM-DD
-    s = re.sub(r'\b(\d{1,2})[\-/](\d{1,2})[\-/](\d{2,4})\b', _date_to_iso, s)
-    return s.strip()
+    return _normalize(s).strip()
+
+def normalize_lines(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Streaming normalize_text: yields pieces whose concatenation equals
+    normalize_text("".join(lines)).
+
+    Input is cut at the last non-space -> space boundary seen so far; every
+    rule only looks across a whitespace run with one character of context on
+    each side, so the text before the cut can be emitted while the trailing
+    whitespace run (plus the character before it) is carried into the next
+    piece. Memory is bounded by the longest line, not the document.
+    """
+    carry = ""
+    context = 0  # leading characters of carry that were already emitted
+    started = False
+    for line in lines:
+        carry += line
+        m = _LAST_BOUNDARY.match(carry, context)
+        if m is None:
+            continue
+        cut = m.end()
+        out = _normalize(carry[:cut])[context:]
+        carry, context = carry[cut - 1:], 1
+        if not started:
+            out = out.lstrip()
+            started = bool(out)
+        if out:
+            yield out
+
+    out = _normalize(carry)[context:].rstrip()
+    if not started:
+        out = out.lstrip()
+    if out:
+        yield out
+
+def _normalize(s: str) -> str:
+    def replace(m):
+        kind = m.lastgroup
+        if kind == 'date':
+            return _iso_date(m.group(2), m.group(3), m.group(4)) or m.group(0)
+        if kind == 'punct':
+            mark = m.group(6)
+            if mark == ',':
+                start, end = m.start(), m.end()
+                # str.isdecimal() is the same character class as \d
+                if start > 0 and end < len(s) and s[start - 1].isdecimal() and s[end].isdecimal():
+                    return '.'
+            return mark
+        if kind == 'spaces':
+            return ' '
+        if kind == 'newlines':
+            return '\n\n'
+        return '.'
+    return _FUSED.sub(replace, s)
 
-def _date_to_iso(m):
-    d, mth, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+@lru_cache(maxsize=4096)
+def _iso_date(day: str, month: str, year: str):
+    d, mth, y = int(day), int(month), int(year)
     if y < 100: y += 2000
     try:
         return datetime(y, mth, d).strftime('%Y-%m-%d')
     except Exception:
-        return m.group(0)
+        return None
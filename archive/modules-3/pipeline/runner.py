@@ -0,0 +1,435 @@
+"""
+Batch document pipeline: read -> normalize -> dedupe -> rewrite (per language)
+-> glossary -> QA -> export, over every document in a folder.
+
+Usage:
+    python -m modules.pipeline.runner --input knowledge_base/raw --out export/out \
+        --langs EN,DE --cpu-workers 4 --llm-workers 8
+
+CPU-bound stages (extraction/normalize/dedupe, and glossary/QA/export) run
+in a process pool; rewrite calls run on a thread pool driven by asyncio.
+Stages are connected by bounded queues, so extraction never runs far ahead
+of the LLM. Every finished document is appended to a manifest CSV (Doc_ID,
+Status, Source_Files, ...) and a JSONL report with per-stage timings and QA
+results. Re-running skips documents whose manifest Status is Done and whose
+Content_Hash is unchanged; it covers the source file and the run config
+(languages, formats, dedupe and rewrite options, and the glossary, QA rules,
+tone and prompt files), so changing any of them re-runs the document.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..utils import metrics
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf', '.docx', '.csv', '.xlsx', '.xls')
+MANIFEST_FIELDS = ['Doc_ID', 'Document_Name', 'Languages', 'Status', 'Source_Files', 'Content_Hash', 'Outputs', 'Updated', 'Notes']
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _config_hash(args, langs: List[str]) -> str:
+    """Fingerprint of every option and input file that changes a document's outputs."""
+    config = {
+        'langs': sorted(langs),
+        'formats': sorted(f.strip() for f in args.formats.split(',') if f.strip()),
+        'doc_type': args.doc_type,
+        'dedupe': args.dedupe,
+        'dedupe_threshold': args.dedupe_threshold,
+        'skip_rewrite': args.skip_rewrite,
+        'chunk_chars': args.chunk_chars,
+        'files': {
+            name: _file_hash(path) if os.path.exists(path) else None
+            for name, path in (('glossary', args.glossary), ('qa_rules', args.qa_rules),
+                               ('tone', args.tone), ('prompts', args.prompts))
+        }
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_manifest(path: str) -> Dict[str, Dict]:
+    """Manifest rows by Doc_ID; the manifest is append-only, so the last row wins."""
+    rows: Dict[str, Dict] = {}
+    if not os.path.exists(path):
+        return rows
+    with open(path, 'r', encoding='utf-8', newline='') as fp:
+        for row in csv.DictReader(fp):
+            rows[row['Doc_ID']] = row
+    return rows
+
+
+def _append_manifest(path: str, row: Dict):
+    new_file = not os.path.exists(path)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8', newline='') as fp:
+        writer = csv.DictWriter(fp, fieldnames=MANIFEST_FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def _append_report(path: str, record: Dict):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as fp:
+        fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _timed(timings: Dict, name: str, fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[name] = round(time.perf_counter() - t0, 4)
+    return result
+
+
+def _read_paragraphs(path: str) -> Tuple[List[str], int]:
+    """
+    Normalized, non-empty paragraphs of a document and its raw length.
+
+    The document is streamed (PDF pages, table batches, text blocks) through
+    normalize_lines and split on blank lines as it arrives, so large tables
+    are never rendered or normalized as one string.
+    """
+    from ..normalize.normalize import normalize_lines
+    from ..utils.io_utils import iter_text_any
+
+    chars_in = 0
+
+    def pieces():
+        nonlocal chars_in
+        for piece in iter_text_any(path):
+            chars_in += len(piece)
+            yield piece
+
+    paragraphs = []
+    pending: List[str] = []  # pieces of the paragraph being assembled
+    with metrics.stage('read_normalize', os.path.getsize(path)):
+        for piece in normalize_lines(pieces()):
+            if '\n\n' not in piece and not (pending and pending[-1].endswith('\n') and piece.startswith('\n')):
+                pending.append(piece)
+                continue
+            parts = ("".join(pending) + piece).split('\n\n')
+            pending = [parts.pop()]
+            paragraphs.extend(p for p in parts if p.strip())
+    tail = "".join(pending)
+    if tail.strip():
+        paragraphs.append(tail)
+    return paragraphs, chars_in
+
+
+def extract_document(path: str, dedupe: str = "minhash", dedupe_threshold: float = 0.8) -> Dict:
+    """
+    CPU stage (runs in a worker process): read, normalize and dedupe the
+    paragraphs of one document.
+    """
+    timings: Dict[str, float] = {}
+    paragraphs, chars_in = _timed(timings, 'read_normalize', _read_paragraphs, path)
+    if dedupe == "minhash":
+        from ..dedupe.dedupe_minhash import remove_near_duplicates_minhash
+        kept = _timed(timings, 'dedupe', remove_near_duplicates_minhash, paragraphs, dedupe_threshold)
+    elif dedupe == "tfidf":
+        from ..dedupe.dedupe_tfidf import remove_near_duplicates_tfidf
+        kept = _timed(timings, 'dedupe', remove_near_duplicates_tfidf, paragraphs, dedupe_threshold)
+    elif dedupe == "embedding":
+        from ..dedupe.dedupe import remove_near_duplicates
+        kept = _timed(timings, 'dedupe', remove_near_duplicates, paragraphs, dedupe_threshold)
+    else:
+        kept = paragraphs
+
+    return {
+        'text': "\n\n".join(kept),
+        'chars_in': chars_in,
+        'paragraphs': len(paragraphs),
+        'paragraphs_removed': len(paragraphs) - len(kept),
+        'timings': timings,
+        # Worker-process metrics travel back with the result
+        'metrics': metrics.snapshot(reset=True) if metrics.enabled() else None
+    }
+
+
+def finalize_document(
+    text: str,
+    lang: str,
+    out_base: str,
+    glossary_path: str,
+    qa_rules_path: str,
+    tone_path: str,
+    formats: List[str]
+) -> Dict:
+    """CPU stage (runs in a worker process): glossary, QA and export for one language variant."""
+    from ..export.exporter import export_docx, export_md
+    from ..glossary.glossary import load_glossary
+    from ..qa.qa import run_qa
+
+    timings: Dict[str, float] = {}
+
+    t0 = time.perf_counter()
+    with metrics.stage('apply_glossary', len(text)):
+        glossary = load_glossary(lang, glossary_path)
+        replacements = 0
+        if glossary is not None:
+            text, replacements = glossary.apply(text)
+    timings['glossary'] = round(time.perf_counter() - t0, 4)
+
+    qa = _timed(timings, 'qa', run_qa, text, qa_rules_path, tone_path, lang)
+
+    t0 = time.perf_counter()
+    outputs = []
+    if 'md' in formats:
+        export_md(text, f"{out_base}_{lang}.md")
+        outputs.append(f"{out_base}_{lang}.md")
+    if 'docx' in formats:
+        export_docx(text, f"{out_base}_{lang}.docx")
+        outputs.append(f"{out_base}_{lang}.docx")
+    timings['export'] = round(time.perf_counter() - t0, 4)
+
+    return {
+        'glossary_replacements': replacements,
+        'qa': qa,
+        'qa_failed': [check['id'] for check in qa if not check['ok']],
+        'outputs': outputs,
+        'timings': timings,
+        'metrics': metrics.snapshot(reset=True) if metrics.enabled() else None
+    }
+
+
+def _rewrite(text: str, lang: str, args) -> Dict:
+    """LLM stage (runs on a thread): chunked rewrite of one language variant."""
+    timings: Dict[str, float] = {}
+    if args.skip_rewrite:
+        return {'text': text, 'metadata': None, 'timings': timings}
+    from ..rewrite.chunked import rewrite_chunked
+    rewritten, metadata = _timed(
+        timings, 'rewrite', rewrite_chunked, text, lang,
+        doc_type=args.doc_type, tone_path=args.tone, prompts_path=args.prompts,
+        max_chars=args.chunk_chars, max_workers=args.chunk_workers
+    )
+    return {'text': rewritten, 'metadata': metadata, 'timings': timings}
+
+
+def discover_documents(input_dir: str) -> List[Dict]:
+    docs = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                path = os.path.join(root, filename)
+                rel = os.path.relpath(path, input_dir)
+                docs.append({'doc_id': rel.replace(os.sep, '/'), 'path': path})
+    return docs
+
+
+class PipelineRunner:
+    """
+    Runs the document pipeline over a list of documents with bounded queues
+    between the extract, rewrite and finalize stages.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.langs = [lang.strip().upper() for lang in args.langs.split(',') if lang.strip()]
+        self.formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+        self.docs: Dict[str, Dict] = {}
+        self.done = 0
+        self.failed = 0
+
+    async def run(self, docs: List[Dict]):
+        args = self.args
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        extract_q: asyncio.Queue = asyncio.Queue()
+        rewrite_q: asyncio.Queue = asyncio.Queue(maxsize=args.queue_size)
+        finalize_q: asyncio.Queue = asyncio.Queue(maxsize=args.queue_size)
+        for doc in docs:
+            extract_q.put_nowait(doc)
+
+        cpu_pool = ProcessPoolExecutor(max_workers=args.cpu_workers)
+        llm_pool = ThreadPoolExecutor(max_workers=args.llm_workers)
+
+        async def extract_worker():
+            while True:
+                doc = await extract_q.get()
+                if doc is None:
+                    return
+                state = self.docs[doc['doc_id']] = {
+                    'doc': doc, 'started': time.perf_counter(), 'pending': len(self.langs),
+                    'report': {'doc_id': doc['doc_id'], 'source': doc['path'], 'langs': {}, 'timings': {}}
+                }
+                try:
+                    extracted = await loop.run_in_executor(
+                        cpu_pool, extract_document, doc['path'], args.dedupe, args.dedupe_threshold
+                    )
+                except Exception as e:
+                    self._finish(state, error=f"extract: {e}")
+                    continue
+                metrics.merge(extracted.pop('metrics'))
+                state['report']['timings'].update(extracted['timings'])
+                for key in ('chars_in', 'paragraphs', 'paragraphs_removed'):
+                    state['report'][key] = extracted[key]
+                if not extracted['text'].strip():
+                    self._finish(state, error="extract: no text")
+                    continue
+                for lang in self.langs:
+                    await rewrite_q.put((state, lang, extracted['text']))
+
+        async def rewrite_worker():
+            while True:
+                item = await rewrite_q.get()
+                if item is None:
+                    return
+                state, lang, text = item
+                try:
+                    rewritten = await loop.run_in_executor(llm_pool, _rewrite, text, lang, args)
+                except Exception as e:
+                    self._lang_done(state, lang, error=f"rewrite: {e}")
+                    continue
+                await finalize_q.put((state, lang, rewritten))
+
+        async def finalize_worker():
+            while True:
+                item = await finalize_q.get()
+                if item is None:
+                    return
+                state, lang, rewritten = item
+                doc = state['doc']
+                out_base = os.path.join(args.out, os.path.splitext(doc['doc_id'])[0])
+                try:
+                    result = await loop.run_in_executor(
+                        cpu_pool, finalize_document, rewritten['text'], lang, out_base,
+                        args.glossary, args.qa_rules, args.tone, self.formats
+                    )
+                except Exception as e:
+                    self._lang_done(state, lang, error=f"finalize: {e}")
+                    continue
+                metrics.merge(result.pop('metrics'))
+                result['timings'].update(rewritten['timings'])
+                result['metadata'] = rewritten['metadata']
+                self._lang_done(state, lang, result=result)
+
+        async def stage(worker, count, queue_after=None, queue_after_count=0):
+            await asyncio.gather(*(worker() for _ in range(count)))
+            if queue_after is not None:
+                for _ in range(queue_after_count):
+                    await queue_after.put(None)
+
+        for _ in range(args.cpu_workers):
+            extract_q.put_nowait(None)
+
+        try:
+            await asyncio.gather(
+                stage(extract_worker, args.cpu_workers, rewrite_q, args.llm_workers),
+                stage(rewrite_worker, args.llm_workers, finalize_q, args.cpu_workers),
+                stage(finalize_worker, args.cpu_workers)
+            )
+        finally:
+            cpu_pool.shutdown()
+            llm_pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        print(f"[PIPELINE] {self.done} done, {self.failed} failed in {elapsed:.1f}s")
+        if args.metrics:
+            metrics.export(args.metrics)
+
+    def _lang_done(self, state: Dict, lang: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        state['report']['langs'][lang] = result if error is None else {'error': error}
+        state['pending'] -= 1
+        if state['pending'] == 0:
+            errors = [f"{l}: {r['error']}" for l, r in state['report']['langs'].items() if 'error' in r]
+            self._finish(state, error="; ".join(errors) or None)
+
+    def _finish(self, state: Dict, error: Optional[str] = None):
+        doc, report = state['doc'], state['report']
+        report['status'] = 'Failed' if error else 'Done'
+        report['error'] = error
+        report['timings']['total'] = round(time.perf_counter() - state['started'], 4)
+        _append_report(self.args.report, report)
+
+        outputs = [o for r in report['langs'].values() for o in r.get('outputs', [])]
+        _append_manifest(self.args.manifest, {
+            'Doc_ID': doc['doc_id'],
+            'Document_Name': Path(doc['path']).stem,
+            'Languages': "/".join(self.langs),
+            'Status': report['status'],
+            'Source_Files': doc['path'],
+            'Content_Hash': doc['hash'],
+            'Outputs': ";".join(outputs),
+            'Updated': datetime.now().isoformat(timespec='seconds'),
+            'Notes': error or ''
+        })
+
+        if error:
+            self.failed += 1
+        else:
+            self.done += 1
+        print(f"[PIPELINE] {report['status']}: {doc['doc_id']} in {report['timings']['total']:.1f}s"
+              + (f" ({error})" if error else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', required=True, help="Folder of source documents (searched recursively)")
+    parser.add_argument('--out', default="export/out")
+    parser.add_argument('--langs', default="EN", help="Comma-separated target languages, e.g. AR,EN,DE")
+    parser.add_argument('--formats', default="docx,md")
+    parser.add_argument('--doc-type', default="Document")
+    parser.add_argument('--manifest', default="export/pipeline_manifest.csv")
+    parser.add_argument('--report', default="export/pipeline_report.jsonl")
+    parser.add_argument('--cpu-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--llm-workers', type=int, default=8)
+    parser.add_argument('--chunk-workers', type=int, default=4, help="Concurrent chunk rewrites per document")
+    parser.add_argument('--chunk-chars', type=int, default=4000)
+    parser.add_argument('--queue-size', type=int, default=16)
+    parser.add_argument('--dedupe', choices=["minhash", "tfidf", "embedding", "none"], default="minhash")
+    parser.add_argument('--dedupe-threshold', type=float, default=0.8)
+    parser.add_argument('--glossary', default="catalog/Glossary.csv")
+    parser.add_argument('--qa-rules', default="configs/qa_rules.yaml")
+    parser.add_argument('--tone', default="configs/tone.yaml")
+    parser.add_argument('--prompts', default="configs/prompts.yaml")
+    parser.add_argument('--skip-rewrite', action='store_true', help="Pass text through without LLM calls")
+    parser.add_argument('--force', action='store_true', help="Reprocess documents already marked Done")
+    parser.add_argument('--metrics', help="Write stage metrics here (.json, otherwise Prometheus text)")
+    parser.add_argument('--profile', default="", help="Comma-separated stages to run under cProfile, or 'all'")
+    args = parser.parse_args()
+
+    if args.metrics or args.profile:
+        metrics.enable(profile=[s.strip() for s in args.profile.split(',') if s.strip()])
+
+    manifest = {} if args.force else load_manifest(args.manifest)
+    langs = [lang.strip().upper() for lang in args.langs.split(',') if lang.strip()]
+    config_hash = _config_hash(args, langs)
+    docs = []
+    skipped = stale = 0
+    for doc in discover_documents(args.input):
+        doc['hash'] = hashlib.sha1(f"{_file_hash(doc['path'])}:{config_hash}".encode('utf-8')).hexdigest()
+        row = manifest.get(doc['doc_id'])
+        if row and row.get('Status') == 'Done':
+            if row.get('Content_Hash') == doc['hash']:
+                skipped += 1
+                continue
+            stale += 1
+        docs.append(doc)
+
+    print(f"[PIPELINE] {len(docs)} documents to process, {skipped} already done")
+    if stale:
+        print(f"[PIPELINE] {stale} done documents re-run: source file or config "
+              "(languages, glossary, QA rules, tone, prompts, options) changed since their last run")
+    if docs:
+        asyncio.run(PipelineRunner(args).run(docs))
+
+
+if __name__ == '__main__':
+    main()
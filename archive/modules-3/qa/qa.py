@@ -1,12 +1,16 @@
-import re, yaml, pandas as pd
-from typing import Dict, List
+import os, re, threading, yaml
+from typing import Dict, List, Optional, Tuple
+from ..utils.aho_corasick import AhoCorasick
+from ..utils.metrics import timed
+
+NUMBER_PATTERN = re.compile(r'\b\d+[\.,]?\d*%?')
 
 def load_yaml(path: str) -> Dict:
     with open(path, 'r', encoding='utf-8') as fp:
         return yaml.safe_load(fp)
 
 def numbers_consistency_check(text: str) -> Dict:
-    nums = re.findall(r'\b\d+[\.,]?\d*%?', text)
+    nums = NUMBER_PATTERN.findall(text)
     return {"id":"numbers_consistency", "ok": True, "detail": f"found_numbers={nums}"}
 
 def banned_phrases_check(text: str, banned: List[str]) -> Dict:
@@ -19,27 +23,131 @@ def require_disclaimer(text: str, disclaimer: str) -> Dict:
     return {"id":"mandatory_disclaimer","ok": ok, "detail": "present" if ok else "missing"}
 
 def require_fact_mapping(text: str, product_master_csv: str) -> Dict:
+    from ..utils.catalog import load_catalog
     try:
-        df = pd.read_csv(product_master_csv)
-        skus = set(df['SKU'].astype(str).tolist())
-        hits = [s for s in skus if s in text]
+        catalog = load_catalog(product_master_csv)
+        if not catalog.has_column('SKU'):
+            raise KeyError('SKU')
+        hits = [s for s in catalog.value_set('SKU') if s in text]
         return {"id":"sku_cnpn_mapping","ok": True, "detail": f"skus_mentioned={hits}"}
     except Exception as e:
         return {"id":"sku_cnpn_mapping","ok": False, "detail": f"error:{e}"}
 
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _banned_pattern(banned: List[str]) -> 're.Pattern':
+    return re.compile(r'(' + r'|'.join(map(re.escape, banned)) + r')', flags=re.IGNORECASE)
+
+class _CatalogMatcher:
+    """SKU/CNPN matcher for one product master CSV, rebuilt when the file changes."""
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self.mtime = _mtime(csv_path)
+        self.error: Optional[str] = None
+        self.matcher: Optional[AhoCorasick] = None
+        from ..utils.catalog import load_catalog
+        try:
+            catalog = load_catalog(csv_path)
+            if not catalog.has_column('SKU'):
+                raise KeyError('SKU')
+            patterns = [(s, ('sku', s)) for s in catalog.value_set('SKU')]
+            patterns += [(c, ('cnpn', c)) for c in catalog.value_set('CNPN')]
+            self.matcher = AhoCorasick(patterns)
+        except Exception as e:
+            self.error = str(e)
+
+    def check(self, text: str) -> Dict:
+        if self.error is not None:
+            return {"id":"sku_cnpn_mapping","ok": False, "detail": f"error:{self.error}"}
+        found = self.matcher.find_all(text)
+        skus = [value for kind, value in found if kind == 'sku']
+        cnpns = [value for kind, value in found if kind == 'cnpn']
+        return {"id":"sku_cnpn_mapping","ok": True, "detail": f"skus_mentioned={skus}, cnpns_mentioned={cnpns}"}
+
+class QAEngine:
+    """
+    QA checks compiled once from the rule and tone files.
+
+    Banned-phrase patterns, disclaimers and the SKU/CNPN matcher are built at
+    load time and rebuilt only when qa_rules.yaml, tone.yaml or a referenced
+    product master CSV changes on disk (checked by mtime on every call).
+    """
+
+    def __init__(self, qa_rules_path: str, tone_path: str):
+        self.qa_rules_path = qa_rules_path
+        self.tone_path = tone_path
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple] = None
+        self._catalogs: Dict[str, _CatalogMatcher] = {}
+        self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        with self._lock:
+            signature = (_mtime(self.qa_rules_path), _mtime(self.tone_path))
+            if signature != self._signature:
+                self._load()
+                self._signature = signature
+            for path, catalog in list(self._catalogs.items()):
+                if _mtime(path) != catalog.mtime:
+                    self._catalogs[path] = _CatalogMatcher(path)
+
+    def _load(self):
+        rules = load_yaml(self.qa_rules_path)
+        tone = load_yaml(self.tone_path)
+        self.banned_pattern = _banned_pattern(tone['claims']['prohibited_keywords'])
+        self.disclaimers = {
+            key: str(value).lower()
+            for key, value in tone['claims']['mandatory_disclaimers']['cosmetics'].items()
+        }
+        self.fact_files = [c['file'] for c in rules['checks'] if c['type'] == 'require_fact_mapping']
+        self._catalogs = {
+            path: self._catalogs.get(path) or _CatalogMatcher(path)
+            for path in self.fact_files
+        }
+
+    def _check(self, text: str, lang_key: str) -> List[Dict]:
+        out = []
+        out.append(numbers_consistency_check(text))
+        hit = self.banned_pattern.search(text)
+        out.append({"id":"banned_claims","ok": not bool(hit),"detail": f"hit={hit.group(0) if hit else None}"})
+        disc = self.disclaimers.get(lang_key, self.disclaimers['en'])
+        ok = disc in text.lower()
+        out.append({"id":"mandatory_disclaimer","ok": ok, "detail": "present" if ok else "missing"})
+        for path in self.fact_files:
+            out.append(self._catalogs[path].check(text))
+        return out
+
+    def check(self, text: str, lang: str = 'EN') -> List[Dict]:
+        return self.check_many([text], lang)[0]
+
+    def check_many(self, texts: List[str], lang: str = 'EN') -> List[List[Dict]]:
+        """Run all checks on every text; files are checked for changes once per batch."""
+        self._reload_if_changed()
+        # Use language-specific disclaimer for validation
+        lang_key = lang.lower()[:2]  # 'en', 'ar', 'de'
+        return [self._check(text, lang_key) for text in texts]
+
+_engines: Dict[Tuple[str, str], QAEngine] = {}
+_engines_lock = threading.Lock()
+
+def get_qa_engine(qa_rules_path: str, tone_path: str) -> QAEngine:
+    """Process-wide QAEngine per (rules, tone) path pair."""
+    key = (os.path.abspath(qa_rules_path), os.path.abspath(tone_path))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = QAEngine(qa_rules_path, tone_path)
+    return engine
+
+@timed('run_qa', size=lambda text, *args, **kwargs: len(text))
 def run_qa(text: str, qa_rules_path: str, tone_path: str, lang: str = 'EN') -> List[Dict]:
-    rules = load_yaml(qa_rules_path)
-    tone = load_yaml(tone_path)
-    out = []
-    out.append(numbers_consistency_check(text))
-    banned = tone['claims']['prohibited_keywords']
-    out.append(banned_phrases_check(text, banned))
-    # Use language-specific disclaimer for validation
-    lang_key = lang.lower()[:2]  # 'en', 'ar', 'de'
-    disc = tone['claims']['mandatory_disclaimers']['cosmetics'].get(lang_key, 
-                tone['claims']['mandatory_disclaimers']['cosmetics']['en'])
-    out.append(require_disclaimer(text, disc))
-    for c in rules['checks']:
-        if c['type'] == 'require_fact_mapping':
-            out.append(require_fact_mapping(text, c['file']))
-    return out
+    return get_qa_engine(qa_rules_path, tone_path).check(text, lang)
+
+@timed('run_qa_many', size=lambda texts, *args, **kwargs: len(texts))
+def run_qa_many(texts: List[str], qa_rules_path: str, tone_path: str, lang: str = 'EN') -> List[List[Dict]]:
+    return get_qa_engine(qa_rules_path, tone_path).check_many(texts, lang)
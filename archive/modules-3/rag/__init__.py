@@ -1,5 +1,30 @@
-from .vector_store import VectorStore
-from .retriever import Retriever
-from .indexer import index_product_master, index_knowledge_base
+# Public names are resolved on first access (PEP 562), so `import modules.rag`
+# does not load chromadb, pandas or the embedding model until they are used.
+import importlib
 
-__all__ = ['VectorStore', 'Retriever', 'index_product_master', 'index_knowledge_base']
+_EXPORTS = {
+    'VectorStore': '.vector_store',
+    'create_vector_store': '.backends',
+    'Retriever': '.retriever',
+    'get_retriever': '.retriever',
+    'QueryCache': '.query_cache',
+    'index_product_master': '.indexer',
+    'index_knowledge_base': '.indexer',
+    'update_product_master': '.indexer',
+    'update_knowledge_base': '.indexer',
+}
+
+__all__ = ['VectorStore', 'create_vector_store', 'Retriever', 'get_retriever', 'QueryCache', 'index_product_master', 'index_knowledge_base', 'update_product_master', 'update_knowledge_base']
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
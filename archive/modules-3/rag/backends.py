@@ -0,0 +1,21 @@
+import os
+from typing import Optional
+
+BACKENDS = ("chroma", "numpy")
+
+def create_vector_store(backend: Optional[str] = None, **kwargs):
+    """
+    Build the configured vector store.
+
+    The backend comes from the argument or the VECTOR_STORE_BACKEND env var
+    ("chroma" by default, or "numpy" for the in-process NumpyVectorStore).
+    Only the selected backend's module is imported.
+    """
+    backend = (backend or os.getenv('VECTOR_STORE_BACKEND', 'chroma')).lower()
+    if backend == "numpy":
+        from .numpy_store import NumpyVectorStore
+        return NumpyVectorStore(**kwargs)
+    if backend == "chroma":
+        from .vector_store import VectorStore
+        return VectorStore(**kwargs)
+    raise ValueError(f"Unknown vector store backend: {backend} (expected one of {BACKENDS})")
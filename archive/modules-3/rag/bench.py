@@ -0,0 +1,150 @@
+"""
+Compare the Chroma and NumPy vector store backends on a synthetic catalog.
+
+Usage:
+    python -m modules.rag.bench --rows 3000 --queries 200
+
+The "numpy" and "chroma" backends get the same deterministic hash-based
+embedding function, so their numbers reflect the stores themselves, not the
+embedding model. "numpy-default" and "chroma-default" use the production
+embedder instead (Chroma's ONNX MiniLM model for both, which must already be
+downloaded; run chroma-default on its own with --backends chroma-default, as
+Chroma allows one client setup per process), to show what a cold worker
+actually pays. "numpy-hashing" uses the NumPy store's model-free hashing
+embedder (NUMPY_STORE_EMBEDDER=hashing). Startup (import + opening the persisted store + first
+query) is measured in a fresh interpreter; query latency is measured in-process.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+DIM = 384
+
+_STARTUP_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+from modules.rag.bench import make_store
+t1 = time.perf_counter()
+store = make_store(sys.argv[1], sys.argv[2])
+t2 = time.perf_counter()
+store.query("product_master", "Beard oil 50ml", n_results=5)
+t3 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "open_s": t2 - t1, "first_query_s": t3 - t2}))
+"""
+
+
+def hash_embed(texts: List[str]) -> np.ndarray:
+    out = np.empty((len(texts), DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        seed = int.from_bytes(hashlib.md5(text.encode('utf-8')).digest()[:4], 'little')
+        out[i] = np.random.default_rng(seed).standard_normal(DIM)
+    out /= np.linalg.norm(out, axis=1, keepdims=True)
+    return out
+
+
+def make_store(backend: str, directory: str):
+    if backend == "numpy-default":
+        from .numpy_store import NumpyVectorStore
+        return NumpyVectorStore(persist_directory=directory)
+    if backend == "numpy-hashing":
+        from .numpy_store import NumpyVectorStore, hashing_embedder
+        return NumpyVectorStore(persist_directory=directory, embedding_function=hashing_embedder)
+    if backend == "chroma-default":
+        from .vector_store import VectorStore
+        return VectorStore(persist_directory=directory)
+    if backend == "numpy":
+        from .numpy_store import NumpyVectorStore
+        return NumpyVectorStore(persist_directory=directory, embedding_function=hash_embed)
+
+    from chromadb.api.types import EmbeddingFunction
+    from .vector_store import VectorStore
+
+    class _HashEmbedding(EmbeddingFunction):
+        def __init__(self):
+            pass
+
+        def __call__(self, input):
+            return hash_embed(list(input)).tolist()
+
+    return VectorStore(persist_directory=directory, embedding_function=_HashEmbedding())
+
+
+def _populate(store, rows: int):
+    categories = ["beard", "hair", "skin", "shaving", "professional"]
+    documents, metadatas, ids = [], [], []
+    for i in range(rows):
+        sku = f"HM-{i:05d}"
+        category = categories[i % len(categories)]
+        documents.append(f"Product: Item {i}\nSKU: {sku}\nCategory: {category}")
+        metadatas.append({'source': 'product_master', 'sku': sku, 'category': category})
+        ids.append(f"product_{sku}")
+    for start in range(0, rows, 1000):
+        store.add_documents("product_master", documents[start:start + 1000], metadatas[start:start + 1000], ids[start:start + 1000])
+
+
+def _startup(backend: str, directory: str) -> dict:
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=package_root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SNIPPET, backend, directory],
+        capture_output=True, text=True, env=env, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - t0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--backends', nargs='+', default=["numpy", "chroma", "numpy-hashing", "numpy-default"])
+    args = parser.parse_args()
+
+    queries = [f"Item {i} category beard" for i in range(args.queries)]
+
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                store = make_store(backend, directory)
+                _populate(store, args.rows)
+            except Exception as e:
+                # ImportError, or a default model that is not available offline.
+                print(f"{backend:>14}: skipped ({type(e).__name__}: {e})")
+                continue
+            del store
+
+            startup = _startup(backend, directory)
+
+            store = make_store(backend, directory)
+            latencies = []
+            for query in queries:
+                t0 = time.perf_counter()
+                store.query("product_master", query, n_results=5)
+                latencies.append(time.perf_counter() - t0)
+            filtered = []
+            for query in queries[:50]:
+                t0 = time.perf_counter()
+                store.query("product_master", query, n_results=5, where={"category": "beard"})
+                filtered.append(time.perf_counter() - t0)
+
+            lat = np.asarray(latencies) * 1000
+            print(
+                f"{backend:>14}: import {startup['import_s']*1000:.0f} ms, open {startup['open_s']*1000:.0f} ms, "
+                f"first query {startup['first_query_s']*1000:.1f} ms, process {startup['process_s']*1000:.0f} ms | "
+                f"query p50 {np.percentile(lat, 50):.2f} ms, p95 {np.percentile(lat, 95):.2f} ms, "
+                f"filtered p50 {np.percentile(np.asarray(filtered) * 1000, 50):.2f} ms"
+            )
+
+
+if __name__ == '__main__':
+    main()
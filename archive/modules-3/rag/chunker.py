@@ -1,15 +1,243 @@
-from typing import List, Dict
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Unit boundaries: whitespace after sentence-ending punctuation (optionally
+# followed by a closing quote or bracket), paragraph breaks and the line break
+# before a markdown heading. Every alternative starts with one of ".!?\n", so
+# the scan skips ordinary text quickly.
+_BREAK = re.compile(r'[.!?]["\')\]]*\s+|\n(?:[ \t]*\n\s*|(?=[ \t]*#{1,6}[ \t]))')
+_HEADING = re.compile(r'[ \t]*#{1,6}[ \t]')
+_WORD = re.compile(r'\S+')
+# Matches one character per word; findall() then returns cached 1-char strings.
+_WORD_START = re.compile(r'(?<!\S)\S')
+
+Unit = Tuple[int, int, int, bool]  # (start, end, tokens, is_heading)
+
+
+class Chunk:
+    """
+    One chunk of a source document, stored as character offsets.
+
+    The text is only sliced out of `source` when `.text` is read, and
+    `metadata` is the dict passed to iter_chunks, shared by every chunk of
+    the document (use to_metadata() for a per-chunk copy).
+    """
+
+    __slots__ = ('source', 'start', 'end', 'index', 'tokens', 'metadata')
+
+    def __init__(self, source: str, start: int, end: int, index: int, tokens: int, metadata: Optional[Dict] = None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.index = index
+        self.tokens = tokens
+        self.metadata = metadata
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def to_metadata(self, **extra) -> Dict:
+        return {**(self.metadata or {}), 'chunk_id': self.index, **extra}
+
+    def __repr__(self) -> str:
+        return f"Chunk(index={self.index}, start={self.start}, end={self.end}, tokens={self.tokens})"
+
+
+def count_words(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    """Default token counter: whitespace-separated words in text[start:end]."""
+    end = len(text) if end is None else end
+    if end - start <= 65536:
+        return len(text[start:end].split())
+    # Long spans are counted without copying them.
+    return len(_WORD_START.findall(text, start, end))
+
+
+def _at_line_start(text: str, pos: int) -> bool:
+    """True when only spaces or tabs separate pos from the start of its line."""
+    while pos and text[pos - 1] in ' \t':
+        pos -= 1
+    return pos == 0 or text[pos - 1] == '\n'
+
+
+def _iter_units(text: str, count_tokens: Optional[Callable[[str], int]]) -> Iterator[Unit]:
+    """Sentences, paragraphs and heading lines of `text` as offsets, whitespace trimmed."""
+    def unit(start: int, end: int) -> Iterator[Unit]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start >= end:
+            return
+        heading = _HEADING.match(text, start) is not None and _at_line_start(text, start)
+        if heading:
+            # A heading is its own unit even when the next line is not blank.
+            newline = text.find('\n', start, end)
+            if newline != -1:
+                yield from unit(start, newline)
+                yield from unit(newline, end)
+                return
+        tokens = count_tokens(text[start:end]) if count_tokens else count_words(text, start, end)
+        yield start, end, tokens, heading
+
+    pos = 0
+    for m in _BREAK.finditer(text):
+        boundary = m.start()
+        if text[boundary] != '\n':
+            # Keep the punctuation and closing quotes with the sentence.
+            boundary += len(m.group().rstrip())
+        yield from unit(pos, boundary)
+        pos = m.end()
+    yield from unit(pos, len(text))
+
+
+@lru_cache(maxsize=64)
+def _up_to_words(n: int) -> 're.Pattern':
+    return re.compile(r'\S+(?:\s+\S+){0,%d}' % (n - 1))
+
+
+@lru_cache(maxsize=64)
+def _skip_words(n: int) -> 're.Pattern':
+    return re.compile(r'(?:\S+\s+){%d}' % n)
+
+
+def _split_unit(
+    text: str,
+    unit: Unit,
+    max_tokens: int,
+    overlap: int,
+    first: int,
+    count_tokens: Optional[Callable[[str], int]]
+) -> Iterator[Unit]:
+    """
+    Cut a unit longer than max_tokens into word windows (sized by its
+    words-per-token ratio); the first window holds at most `first` tokens.
+    Window ends are found with one regex match each, so nothing is copied.
+    """
+    start, end, tokens, heading = unit
+    ratio = count_words(text, start, end) / max(tokens, 1) if count_tokens else 1.0
+    size = max(1, int(max_tokens * ratio))
+    keep = int(overlap * ratio)
+    n = max(1, int(first * ratio))
+    pos = start
+    while True:
+        window_end = _up_to_words(n).match(text, pos, end).end()
+        if window_end >= end:
+            yield pos, end, max(1, round(count_words(text, pos, end) / ratio)), heading
+            return
+        yield pos, window_end, max(1, round(n / ratio)), heading
+        pos = _skip_words(max(1, n - keep)).match(text, pos, end).end()
+        n = size
+
+
+def iter_chunks(
+    text: str,
+    metadata: Optional[Dict] = None,
+    max_tokens: int = 500,
+    overlap: int = 50,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    min_tokens: Optional[int] = None
+) -> Iterator[Chunk]:
+    """
+    Split text into chunks of at most max_tokens tokens, lazily.
+
+    Chunks are built from whole sentences, so a chunk never ends mid-sentence
+    unless a single sentence exceeds the budget (it is then cut into word
+    windows). A markdown heading starts a new chunk once the current one holds
+    at least min_tokens (default max_tokens // 4), so sections are not glued to
+    the tail of the previous one. Consecutive chunks within a section share up
+    to `overlap` tokens of trailing sentences.
+
+    Args:
+        text: Source document; chunks keep offsets into it instead of copies
+        metadata: Dict shared (not copied) by every yielded Chunk
+        max_tokens: Token budget per chunk
+        overlap: Tokens of trailing context repeated at the start of the next chunk
+        count_tokens: Token counter for a string (e.g. a tokenizer's len(encode(s)));
+            defaults to counting whitespace-separated words
+        min_tokens: Minimum chunk size before a heading forces a new chunk
+
+    Yields:
+        Chunk records with (start, end) offsets into `text`
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    overlap = max(0, min(overlap, max_tokens - 1))
+    if min_tokens is None:
+        min_tokens = max_tokens // 4
+
+    window: List[Unit] = []
+    total = 0
+    index = 0
+
+    def flush() -> Chunk:
+        nonlocal index
+        chunk = Chunk(text, window[0][0], window[-1][1], index, total, metadata)
+        index += 1
+        return chunk
+
+    def carry_overlap():
+        nonlocal window, total
+        kept, kept_tokens = [], 0
+        for u in reversed(window):
+            if kept_tokens + u[2] > overlap:
+                break
+            kept.append(u)
+            kept_tokens += u[2]
+        window, total = kept[::-1], kept_tokens
+
+    for unit in _iter_units(text, count_tokens):
+        tokens, heading = unit[2], unit[3]
+        if heading and window and total >= min_tokens:
+            yield flush()
+            window, total = [], 0
+        elif window and total + tokens > max_tokens:
+            # A heading is moved to the next chunk rather than ending this one.
+            headings = []
+            while window and window[-1][3]:
+                headings.insert(0, window.pop())
+                total -= headings[0][2]
+            if window:
+                yield flush()
+                if headings:
+                    # The heading opens the next chunk; no overlap is carried across it.
+                    window, total = [], 0
+                else:
+                    carry_overlap()
+                    # Drop carried context that would not leave room for this unit.
+                    while window and total + tokens > max_tokens:
+                        total -= window.pop(0)[2]
+            window += headings
+            total += sum(h[2] for h in headings)
+
+        if total + tokens <= max_tokens:
+            window.append(unit)
+            total += tokens
+            continue
+
+        # Here the window is empty or holds only headings: cut the unit into
+        # word windows, the first one filling the room left after the headings.
+        if total >= max_tokens:
+            yield flush()
+            window, total = [], 0
+        for i, piece in enumerate(_split_unit(text, unit, max_tokens, overlap, max_tokens - total, count_tokens)):
+            if i:
+                yield flush()
+                window, total = [], 0
+            window.append(piece)
+            total += piece[2]
+
+    if window:
+        yield flush()
+
 
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    words = text.split()
-    chunks = []
-    
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i + chunk_size])
-        if chunk:
-            chunks.append(chunk)
-    
-    return chunks
+    return [chunk.text for chunk in iter_chunks(text, max_tokens=chunk_size, overlap=overlap)]
+
 
 def chunk_with_metadata(
     text: str,
@@ -17,12 +245,10 @@ def chunk_with_metadata(
     chunk_size: int = 500,
     overlap: int = 50
 ) -> List[Dict]:
-    chunks = chunk_text(text, chunk_size, overlap)
-    
     return [
         {
-            'text': chunk,
-            'metadata': {**metadata, 'chunk_id': i}
+            'text': chunk.text,
+            'metadata': chunk.to_metadata()
         }
-        for i, chunk in enumerate(chunks)
+        for chunk in iter_chunks(text, metadata, max_tokens=chunk_size, overlap=overlap)
     ]
@@ -1,48 +1,223 @@
-import pandas as pd
 import os
-from typing import Optional
-from .vector_store import VectorStore
-from .chunker import chunk_with_metadata
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+from .backends import create_vector_store
+from .chunker import iter_chunks
+from .lexical_index import LexicalIndex, register_lexical_index
+
+if TYPE_CHECKING:
+    from .vector_store import VectorStore
+
+KNOWLEDGE_EXTENSIONS = ('.txt', '.md', '.pdf', '.docx')
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+PRODUCT_TEXT_TEMPLATE = [
+    ("Product: ", 'Product_Name'),
+    ("\nSKU: ", 'SKU'),
+    ("\nCNPN: ", 'CNPN'),
+    ("\nCategory: ", 'Category'),
+    ("\nClaims: ", 'Allowed_Claims')
+]
+
+def _product_documents(csv_path: str) -> Tuple[List[str], List[Dict], List[str]]:
+    from ..utils.catalog import load_catalog
+    catalog = load_catalog(csv_path)
+    texts = catalog.join_columns(PRODUCT_TEXT_TEMPLATE).tolist()
+    columns = zip(
+        catalog.column('SKU').tolist(),
+        catalog.column('CNPN').tolist(),
+        catalog.column('Product_Name').tolist(),
+        catalog.column('Category').tolist()
+    )
 
-def index_product_master(
-    csv_path: str = "catalog/Product_Master.csv",
-    vector_store: Optional[VectorStore] = None
-) -> int:
-    if vector_store is None:
-        vector_store = VectorStore()
-    
-    vector_store.reset_collection("product_master")
-    
-    if not os.path.exists(csv_path):
-        return 0
-    
-    df = pd.read_csv(csv_path)
-    
     documents = []
     metadatas = []
     ids = []
-    
-    for idx, row in df.iterrows():
-        sku = str(row.get('SKU', ''))
-        cnpn = str(row.get('CNPN', ''))
-        name = str(row.get('Product_Name', ''))
-        claims = str(row.get('Allowed_Claims', ''))
-        category = str(row.get('Category', ''))
-        
-        text = f"Product: {name}\nSKU: {sku}\nCNPN: {cnpn}\nCategory: {category}\nClaims: {claims}"
-        
+    seen_ids = set()
+
+    for idx, (text, (sku, cnpn, name, category)) in enumerate(zip(texts, columns)):
         metadata = {
             'source': 'product_master',
             'sku': sku,
             'cnpn': cnpn,
             'product_name': name,
-            'category': category
+            'category': category,
+            'content_hash': _content_hash(text)
         }
-        
+
+        # Key rows by SKU so ids survive rows being inserted or reordered.
+        doc_id = f"product_{sku}" if sku else f"product_{idx}"
+        if doc_id in seen_ids:
+            doc_id = f"{doc_id}_{idx}"
+        seen_ids.add(doc_id)
+
         documents.append(text)
         metadatas.append(metadata)
-        ids.append(f"product_{idx}")
-    
+        ids.append(doc_id)
+
+    return documents, metadatas, ids
+
+def _knowledge_documents(filepath: str, filename: str, content: str) -> Tuple[List[str], List[Dict], List[str]]:
+    base_metadata = {
+        'source': 'knowledge_base',
+        'filename': filename,
+        'filepath': filepath,
+        'file_hash': _content_hash(content)
+    }
+
+    documents = []
+    metadatas = []
+    ids = []
+    for chunk in iter_chunks(content, base_metadata, max_tokens=500, overlap=50):
+        text = chunk.text
+        documents.append(text)
+        metadatas.append(chunk.to_metadata(content_hash=_content_hash(text)))
+        ids.append(f"kb_{filename}_{chunk.index}")
+
+    return documents, metadatas, ids
+
+class _BatchWriter:
+    """Buffers documents and writes them to the store in batches of batch_size."""
+
+    def __init__(self, vector_store: 'VectorStore', collection_name: str, batch_size: int, upsert: bool = True):
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+        self.write = vector_store.upsert_documents if upsert else vector_store.add_documents
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.ids: List[str] = []
+        self.written = 0
+
+    def add(self, documents: List[str], metadatas: List[Dict], ids: List[str]):
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self.ids.extend(ids)
+        while len(self.documents) >= self.batch_size:
+            self._write(self.batch_size)
+
+    def close(self):
+        if self.documents:
+            self._write(len(self.documents))
+
+    def _write(self, n: int):
+        self.write(
+            collection_name=self.collection_name,
+            documents=self.documents[:n],
+            metadatas=self.metadatas[:n],
+            ids=self.ids[:n]
+        )
+        self.written += n
+        del self.documents[:n], self.metadatas[:n], self.ids[:n]
+
+def _sync_collection(
+    vector_store: 'VectorStore',
+    collection_name: str,
+    groups: Iterable[Tuple[List[str], List[Dict], List[str]]],
+    existing: Dict[str, Dict],
+    keep_ids: Optional[set] = None,
+    batch_size: int = 256
+) -> Dict[str, int]:
+    """
+    Upsert documents whose content hash changed and delete ids that are no
+    longer produced. Ids in keep_ids are left alone even if not in any group.
+
+    `groups` yields (documents, metadatas, ids) lists, e.g. one per file, and
+    may be a generator: changed documents are upserted in batches of
+    batch_size as the groups are consumed. keep_ids is read only after the
+    last group, so the generator may still add to it.
+    """
+    stats = {'added': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
+    current = set()
+
+    with vector_store.bulk_write():
+        writer = _BatchWriter(vector_store, collection_name, batch_size)
+        for documents, metadatas, ids in groups:
+            up_docs, up_metas, up_ids = [], [], []
+            for doc, meta, doc_id in zip(documents, metadatas, ids):
+                current.add(doc_id)
+                old = existing.get(doc_id)
+                if old is not None and old.get('content_hash') == meta['content_hash']:
+                    stats['skipped'] += 1
+                    continue
+                stats['updated' if old is not None else 'added'] += 1
+                up_docs.append(doc)
+                up_metas.append(meta)
+                up_ids.append(doc_id)
+            writer.add(up_docs, up_metas, up_ids)
+        writer.close()
+
+        current |= keep_ids or set()
+        stale = [doc_id for doc_id in existing if doc_id not in current]
+        if stale:
+            vector_store.delete_documents(collection_name, stale)
+    stats['deleted'] = len(stale)
+    if writer.written or stale:
+        vector_store.bump_version(collection_name)
+
+    return stats
+
+def _iter_knowledge_files(knowledge_dir: str) -> Iterator[Tuple[str, str]]:
+    """Yield (filepath, name relative to knowledge_dir) for supported files, recursively."""
+    for root, dirs, files in os.walk(knowledge_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if not filename.lower().endswith(KNOWLEDGE_EXTENSIONS):
+                continue
+            filepath = os.path.join(root, filename)
+            yield filepath, os.path.relpath(filepath, knowledge_dir)
+
+def _read_knowledge_file(filepath: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Worker entry point: returns (filepath, content, error)."""
+    try:
+        from ..utils.io_utils import read_text_any
+        return filepath, read_text_any(filepath), None
+    except Exception as e:
+        return filepath, None, str(e)
+
+def _read_files(filepaths: Iterable[str], max_workers: Optional[int] = None) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Read files in a process pool, yielding results as they complete.
+
+    At most 2 * max_workers reads are in flight, so a slow consumer (e.g. the
+    vector store write) throttles reading instead of buffering every file.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        for filepath in filepaths:
+            yield _read_knowledge_file(filepath)
+        return
+
+    pending = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for filepath in filepaths:
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(_read_knowledge_file, filepath))
+        for future in pending:
+            yield future.result()
+
+def index_product_master(
+    csv_path: str = "catalog/Product_Master.csv",
+    vector_store: Optional['VectorStore'] = None
+) -> int:
+    if vector_store is None:
+        vector_store = create_vector_store()
+
+    vector_store.reset_collection("product_master")
+
+    if not os.path.exists(csv_path):
+        vector_store.bump_version("product_master")
+        return 0
+
+    documents, metadatas, ids = _product_documents(csv_path)
+
     if documents:
         vector_store.add_documents(
             collection_name="product_master",
@@ -50,62 +225,134 @@ def index_product_master(
             metadatas=metadatas,
             ids=ids
         )
-    
+    version = vector_store.bump_version("product_master")
+    register_lexical_index(vector_store, "product_master", LexicalIndex(ids, documents, metadatas, version=version))
+
     return len(documents)
 
+def update_product_master(
+    csv_path: str = "catalog/Product_Master.csv",
+    vector_store: Optional['VectorStore'] = None
+) -> Dict[str, int]:
+    """
+    Incrementally sync the product_master collection with the CSV.
+
+    Only rows whose text changed are re-embedded; rows that disappeared are
+    deleted. The collection stays queryable throughout.
+
+    Returns:
+        Dict with added, updated, deleted and skipped counts
+    """
+    if vector_store is None:
+        vector_store = create_vector_store()
+
+    existing = vector_store.get_metadatas("product_master")
+
+    if os.path.exists(csv_path):
+        documents, metadatas, ids = _product_documents(csv_path)
+    else:
+        documents, metadatas, ids = [], [], []
+
+    stats = _sync_collection(vector_store, "product_master", [(documents, metadatas, ids)], existing)
+    version = vector_store.get_version("product_master")
+    register_lexical_index(vector_store, "product_master", LexicalIndex(ids, documents, metadatas, version=version))
+    print(f"[INDEX] product_master: {stats}")
+    return stats
+
 def index_knowledge_base(
     knowledge_dir: str = "knowledge_base",
-    vector_store: Optional[VectorStore] = None
+    vector_store: Optional['VectorStore'] = None,
+    batch_size: int = 256,
+    max_workers: Optional[int] = None
 ) -> int:
+    """
+    Rebuild the knowledge_base collection from every supported file under
+    knowledge_dir (recursively; .txt, .md, .pdf, .docx).
+
+    Files are read in a process pool and chunked as they arrive; chunks are
+    written to the vector store in batches of batch_size, so memory stays
+    bounded regardless of the size of the knowledge folder.
+    """
     if vector_store is None:
-        vector_store = VectorStore()
-    
+        vector_store = create_vector_store()
+    # Created first so an invalid batch_size fails before the collection is reset.
+    writer = _BatchWriter(vector_store, "knowledge_base", batch_size, upsert=False)
+
     vector_store.reset_collection("knowledge_base")
-    
+
     if not os.path.exists(knowledge_dir):
         os.makedirs(knowledge_dir, exist_ok=True)
+        vector_store.bump_version("knowledge_base")
         return 0
-    
-    documents = []
-    metadatas = []
-    ids = []
-    
-    for filename in os.listdir(knowledge_dir):
-        if not filename.endswith(('.txt', '.md')):
-            continue
-        
-        filepath = os.path.join(knowledge_dir, filename)
-        
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            chunked = chunk_with_metadata(
-                content,
-                metadata={
-                    'source': 'knowledge_base',
-                    'filename': filename,
-                    'filepath': filepath
-                },
-                chunk_size=500,
-                overlap=50
-            )
-            
-            for i, item in enumerate(chunked):
-                documents.append(item['text'])
-                metadatas.append(item['metadata'])
-                ids.append(f"kb_{filename}_{i}")
-        
-        except Exception as e:
-            print(f"Error indexing {filename}: {e}")
-            continue
-    
-    if documents:
-        vector_store.add_documents(
-            collection_name="knowledge_base",
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-    
-    return len(documents)
+
+    names = dict(_iter_knowledge_files(knowledge_dir))
+
+    # Batches are embedded as they fill up, but saved once at the end.
+    with vector_store.bulk_write():
+        for filepath, content, error in _read_files(names, max_workers):
+            if error is not None:
+                print(f"Error indexing {names[filepath]}: {error}")
+                continue
+            writer.add(*_knowledge_documents(filepath, names[filepath], content))
+        writer.close()
+    vector_store.bump_version("knowledge_base")
+
+    return writer.written
+
+def update_knowledge_base(
+    knowledge_dir: str = "knowledge_base",
+    vector_store: Optional['VectorStore'] = None,
+    max_workers: Optional[int] = None,
+    batch_size: int = 256
+) -> Dict[str, int]:
+    """
+    Incrementally sync the knowledge_base collection with the files on disk.
+
+    Files whose content hash is unchanged are skipped without re-chunking;
+    for changed files only chunks whose text changed are re-embedded, in
+    batches of batch_size as files are read. Chunks of deleted files (or
+    surplus chunks of shortened files) are removed.
+
+    Returns:
+        Dict with added, updated, deleted and skipped counts
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+    if vector_store is None:
+        vector_store = create_vector_store()
+
+    existing = vector_store.get_metadatas("knowledge_base")
+
+    file_hashes: Dict[str, set] = {}
+    ids_by_file: Dict[str, List[str]] = {}
+    for doc_id, meta in existing.items():
+        filepath = (meta or {}).get('filepath')
+        file_hashes.setdefault(filepath, set()).add((meta or {}).get('file_hash'))
+        ids_by_file.setdefault(filepath, []).append(doc_id)
+
+    unchanged_ids = set()
+
+    def changed_files() -> Iterator[Tuple[List[str], List[Dict], List[str]]]:
+        if not os.path.exists(knowledge_dir):
+            return
+        names = dict(_iter_knowledge_files(knowledge_dir))
+        for filepath, content, error in _read_files(names, max_workers):
+            if error is not None:
+                print(f"Error indexing {names[filepath]}: {error}")
+                # Leave the previously indexed chunks in place.
+                unchanged_ids.update(ids_by_file.get(filepath, []))
+                continue
+
+            if file_hashes.get(filepath) == {_content_hash(content)}:
+                unchanged_ids.update(ids_by_file[filepath])
+                continue
+
+            yield _knowledge_documents(filepath, names[filepath], content)
+
+    stats = _sync_collection(
+        vector_store, "knowledge_base", changed_files(), existing,
+        keep_ids=unchanged_ids, batch_size=batch_size
+    )
+    stats['skipped'] += len(unchanged_ids)
+    print(f"[INDEX] knowledge_base: {stats}")
+    return stats
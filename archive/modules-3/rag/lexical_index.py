@@ -0,0 +1,155 @@
+import heapq
+import math
+import re
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Identifier candidates: alphanumeric runs joined by - _ . / (e.g. "HM-0012",
+# "CN/4711"), so a trailing full stop or comma is not part of the token.
+_IDENTIFIER = re.compile(r'\w+(?:[-_./]\w+)*')
+_TERM = re.compile(r'\w+')
+
+IDENTIFIER_FIELDS = ('sku', 'cnpn')
+MIN_IDENTIFIER_LENGTH = 3
+
+
+def _terms(text: str) -> List[str]:
+    return _TERM.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    In-memory inverted index over one collection.
+
+    Exact identifiers (metadata fields in IDENTIFIER_FIELDS, case-insensitive)
+    map straight to rows, so a query that mentions a SKU or CNPN is resolved
+    with one dict lookup per query token and no embedding. Everything else is
+    scored with Okapi BM25 over the document text (which for product_master
+    holds the product name, SKU, CNPN, category and claims).
+
+    Args:
+        ids, documents, metadatas: Collection contents, as returned by
+            get_documents()
+        version: Collection version the index was built from
+        k1, b: BM25 parameters
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        version: int = 0,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = [meta or {} for meta in metadatas]
+        self.version = version
+        self.k1 = k1
+        self.b = b
+
+        self.identifiers: Dict[str, List[int]] = {}
+        for row, meta in enumerate(self.metadatas):
+            for field in IDENTIFIER_FIELDS:
+                value = str(meta.get(field) or '').strip()
+                if len(value) >= MIN_IDENTIFIER_LENGTH and value.lower() != 'nan':
+                    rows = self.identifiers.setdefault(value.casefold(), [])
+                    if row not in rows:
+                        rows.append(row)
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for row, document in enumerate(self.documents):
+            terms = _terms(document or '')
+            self.lengths.append(len(terms))
+            counts: Dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((row, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def match_identifiers(self, query: str) -> List[int]:
+        """Rows whose SKU/CNPN occurs as a token of `query`, in order of first mention."""
+        rows: List[int] = []
+        for m in _IDENTIFIER.finditer(query):
+            token = m.group().casefold()
+            for row in self.identifiers.get(token, ()):
+                if row not in rows:
+                    rows.append(row)
+        return rows
+
+    def rows_for(self, field: str, value: str) -> List[int]:
+        """Rows whose metadata `field` equals `value` (identifier fields only)."""
+        value = str(value).casefold()
+        return [row for row in self.identifiers.get(value, []) if str(self.metadatas[row].get(field, '')).casefold() == value]
+
+    def bm25(self, query: str, n: int = 10, max_df: float = 0.5) -> List[Tuple[int, float]]:
+        """
+        Top-n (row, score) by BM25. Terms that occur in more than max_df of
+        all documents (field labels, stop words) are skipped: their idf is
+        close to zero but their posting lists are the longest.
+        """
+        total = len(self.ids)
+        if not total or n <= 0:
+            return []
+        df_limit = max(1, int(total * max_df))
+        k1, b, avg_length, lengths = self.k1, self.b, self.avg_length or 1.0, self.lengths
+
+        scores: Dict[int, float] = {}
+        for term in set(_terms(query)):
+            postings = self.postings.get(term)
+            if not postings or len(postings) > df_limit:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for row, tf in postings:
+                norm = tf + k1 * (1 - b + b * lengths[row] / avg_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (k1 + 1) / norm
+        return heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List], k: int = 60) -> List[Tuple[object, float]]:
+    """Fuse ranked lists of keys: score(key) = sum of 1 / (k + rank) over the lists it appears in."""
+    scores: Dict[object, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+_indexes: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def register_lexical_index(vector_store, collection_name: str, index: LexicalIndex):
+    """Install an index built by the indexer, so readers in this process skip the rebuild."""
+    with _indexes_lock:
+        _indexes.setdefault(vector_store, {})[collection_name] = index
+
+
+def get_lexical_index(vector_store, collection_name: str = "product_master") -> Optional[LexicalIndex]:
+    """
+    LexicalIndex for a store's collection, rebuilt from get_documents() when
+    the collection version changes (the indexer bumps it on every write).
+    Returns None if the store cannot list its documents.
+    """
+    version = vector_store.get_version(collection_name)
+    with _indexes_lock:
+        index = _indexes.get(vector_store, {}).get(collection_name)
+        if index is not None and index.version == version:
+            return index
+        try:
+            records = vector_store.get_documents(collection_name)
+        except Exception as e:
+            print(f"[RAG] Lexical index unavailable for {collection_name}: {e}")
+            return None
+        index = LexicalIndex(records['ids'], records['documents'], records['metadatas'], version=version)
+        _indexes.setdefault(vector_store, {})[collection_name] = index
+        return index
@@ -0,0 +1,432 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .query_cache import CollectionVersions
+from ..utils.metrics import timed
+
+COLLECTIONS = ("product_master", "knowledge_base")
+HASHING_DIM = 384
+_WORDS = re.compile(r'\w+')
+
+
+def hashing_embedder(texts: List[str], dim: int = HASHING_DIM) -> np.ndarray:
+    """
+    Signed feature hashing of words and character trigrams: no model to load,
+    deterministic across processes, and good enough for lexical similarity
+    over catalog rows (exact SKU/CNPN lookups go through the lexical index).
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        cols: List[int] = []
+        signs: List[float] = []
+        for word in _WORDS.findall(text.lower()):
+            padded = f" {word} "
+            for feature in [word] + [padded[j:j + 3] for j in range(len(padded) - 2)]:
+                h = zlib.crc32(feature.encode('utf-8'))
+                cols.append(h % dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        if cols:
+            np.add.at(out[i], cols, signs)
+    return out
+
+
+_chroma_embedding_function = None
+_chroma_embedding_lock = threading.Lock()
+
+
+def chroma_embedder(texts: List[str]) -> np.ndarray:
+    """
+    Chroma's default embedding function through the shared embedding cache,
+    i.e. the same model and cached vectors as the Chroma backend (chromadb is
+    imported on first use).
+    """
+    global _chroma_embedding_function
+    with _chroma_embedding_lock:
+        if _chroma_embedding_function is None:
+            from .vector_store import CachedEmbeddingFunction
+            _chroma_embedding_function = CachedEmbeddingFunction()
+    return np.asarray(_chroma_embedding_function(list(texts)), dtype=np.float32)
+
+
+def _sentence_transformer_embedder(texts: List[str]) -> np.ndarray:
+    # Imported lazily so that loading the store does not pull in torch.
+    from ..dedupe.dedupe import embed_chunks
+    return embed_chunks(texts)
+
+
+EMBEDDERS: Dict[str, Callable[[List[str]], np.ndarray]] = {
+    'chroma': chroma_embedder,
+    'hashing': hashing_embedder,
+    'sentence-transformers': _sentence_transformer_embedder
+}
+
+
+def _default_embedder() -> Callable[[List[str]], np.ndarray]:
+    name = os.getenv('NUMPY_STORE_EMBEDDER', 'chroma').lower()
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown NUMPY_STORE_EMBEDDER: {name} (expected one of {tuple(EMBEDDERS)})")
+    return EMBEDDERS[name]
+
+
+class _Collection:
+    """Exact-search collection: normalized float32 matrix plus records and a metadata column index."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+        self.row_of: Dict[str, int] = {}
+        self._columns: Optional[Dict[str, Dict]] = None
+        # Writable copy of the embeddings with spare rows, while writes are pending.
+        self._buffer: Optional[np.ndarray] = None
+        self.dirty = False
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def _emb_path(self) -> str:
+        return os.path.join(self.directory, 'embeddings.npy')
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.directory, 'records.json')
+
+    def _load(self):
+        if not os.path.exists(self._records_path) or not os.path.exists(self._emb_path):
+            self._reindex()
+            return
+        with open(self._records_path, 'r', encoding='utf-8') as fp:
+            records = json.load(fp)
+        self.ids = records['ids']
+        self.documents = records['documents']
+        self.metadatas = records['metadatas']
+        self.embeddings = np.load(self._emb_path, mmap_mode='r')
+        self._reindex()
+
+    def _reindex(self):
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._columns = None
+
+    @property
+    def columns(self) -> Dict[str, Dict]:
+        """Metadata field -> value -> rows; built on the first filtered query after a write."""
+        if self._columns is None:
+            columns: Dict[str, Dict] = {}
+            for row, meta in enumerate(self.metadatas):
+                for field, value in (meta or {}).items():
+                    if isinstance(value, (str, int, float, bool)):
+                        columns.setdefault(field, {}).setdefault(value, []).append(row)
+            self._columns = {
+                field: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()}
+                for field, values in columns.items()
+            }
+        return self._columns
+
+    def reserve(self, rows: int, dim: int) -> np.ndarray:
+        """Writable buffer with room for `rows` rows; capacity doubles, so appends are amortized O(1)."""
+        buffer = self._buffer
+        if buffer is None or len(buffer) < rows:
+            grown = np.empty((max(rows, 2 * len(buffer) if buffer is not None else rows), dim), dtype=np.float32)
+            current = len(self)
+            if current:
+                grown[:current] = self.embeddings
+            self._buffer = buffer = grown
+        return buffer
+
+    def keep_rows(self, keep: np.ndarray):
+        """Drop every row whose index is not in `keep` (sorted)."""
+        dim = self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+        self._buffer = np.asarray(self.embeddings)[keep] if len(keep) else np.empty((0, dim), dtype=np.float32)
+        self.ids = [self.ids[row] for row in keep]
+        self.documents = [self.documents[row] for row in keep]
+        self.metadatas = [self.metadatas[row] for row in keep]
+        self._reindex()
+
+    def commit(self, deferred: bool):
+        """Publish buffered writes to queries; write them to disk unless deferred."""
+        self.embeddings = self._buffer[:len(self)]
+        self._columns = None
+        if deferred:
+            self.dirty = True
+        else:
+            self.save()
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_emb = self._emb_path + '.tmp.npy'
+        np.save(tmp_emb, np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        tmp_records = self._records_path + '.tmp'
+        with open(tmp_records, 'w', encoding='utf-8') as fp:
+            json.dump({'ids': self.ids, 'documents': self.documents, 'metadatas': self.metadatas}, fp, ensure_ascii=False)
+        # Drop the old memory map before replacing the file underneath it.
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+        os.replace(tmp_emb, self._emb_path)
+        os.replace(tmp_records, self._records_path)
+        self.embeddings = np.load(self._emb_path, mmap_mode='r')
+        self._buffer = None
+        self.dirty = False
+
+    def select(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Row indices matching a Chroma-style where filter (None means all rows)."""
+        if not where:
+            return None
+        parts = []
+        for field, cond in where.items():
+            if field == '$and':
+                rows = None
+                for sub in cond:
+                    sub_rows = self.select(sub)
+                    rows = sub_rows if rows is None else np.intersect1d(rows, sub_rows)
+                parts.append(rows if rows is not None else np.arange(len(self)))
+            elif field == '$or':
+                subs = [self.select(sub) for sub in cond]
+                if any(sub is None for sub in subs):
+                    parts.append(np.arange(len(self)))
+                else:
+                    parts.append(np.unique(np.concatenate(subs)) if subs else np.empty(0, dtype=np.int64))
+            else:
+                column = self.columns.get(field, {})
+                if isinstance(cond, dict):
+                    if '$eq' in cond:
+                        values = [cond['$eq']]
+                    elif '$in' in cond:
+                        values = list(cond['$in'])
+                    else:
+                        raise ValueError(f"Unsupported where operator: {cond}")
+                else:
+                    values = [cond]
+                hits = [column[v] for v in values if v in column]
+                parts.append(np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64))
+        rows = parts[0]
+        for other in parts[1:]:
+            rows = np.intersect1d(rows, other)
+        return rows
+
+
+class NumpyVectorStore:
+    """
+    In-process vector store with the VectorStore interface, for small catalogs.
+
+    Each collection keeps its normalized embeddings in one contiguous float32
+    array saved as embeddings.npy (memory-mapped on load) next to a
+    records.json with ids, documents and metadatas. Queries are exact cosine
+    top-k via argpartition; `where` filters are resolved through a column index
+    built from the metadata. Each write rewrites the collection files; inside
+    a bulk_write() block, writes stay in memory and are saved once when the
+    block exits, so bulk indexing costs one rewrite instead of one per batch.
+
+    Without an explicit embedding_function the embedder is chosen by the
+    NUMPY_STORE_EMBEDDER env var: "chroma" (default; the model the Chroma
+    backend uses, so switching backends keeps retrieval quality),
+    "sentence-transformers" (the dedupe model; loads torch on first use) or
+    "hashing" (numpy only, no model; for tests and benchmarks). Vectors from
+    different embedders are not comparable, so re-index after switching.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = "export/.cache/numpy_store",
+        embedding_function: Optional[Callable[[List[str]], np.ndarray]] = None
+    ):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function or _default_embedder()
+        self.versions = CollectionVersions(persist_directory)
+        self._lock = threading.Lock()
+        self._deferred = 0
+        self._collections = {name: _Collection(os.path.join(persist_directory, name)) for name in COLLECTIONS}
+        self._loaded_versions = {name: self.get_version(name) for name in COLLECTIONS}
+
+    def _collection(self, collection_name: str) -> _Collection:
+        """The collection, reloaded from disk if another store or process has re-indexed it since."""
+        name = "product_master" if collection_name == "product_master" else "knowledge_base"
+        collection = self._collections[name]
+        version = self.get_version(name)
+        if version != self._loaded_versions[name] and not collection.dirty:
+            collection = self._collections[name] = _Collection(collection.directory)
+            self._loaded_versions[name] = version
+        return collection
+
+    @contextmanager
+    def bulk_write(self) -> Iterator[None]:
+        """
+        Defer saving until the block exits. Writes are visible to queries in
+        this process immediately, but not to other processes until then.
+        """
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    for collection in self._collections.values():
+                        if collection.dirty:
+                            collection.save()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        emb = np.asarray(self.embedding_function(list(texts)), dtype=np.float32)
+        if emb.size:
+            norms = np.linalg.norm(emb, axis=1, keepdims=True)
+            emb = emb / np.where(norms == 0, 1, norms)
+        return emb
+
+    @timed('vector_store.add_documents', size=lambda self, collection_name, documents, *args, **kwargs: len(documents))
+    def add_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: Optional[List[str]] = None
+    ):
+        if ids is None:
+            ids = [hashlib.md5(doc.encode()).hexdigest() for doc in documents]
+        with self._lock:
+            collection = self._collection(collection_name)
+            duplicates = [doc_id for doc_id in ids if doc_id in collection.row_of]
+            if duplicates:
+                raise ValueError(f"Ids already exist in {collection_name}: {duplicates[:5]}")
+        self.upsert_documents(collection_name, documents, metadatas, ids)
+
+    @timed('vector_store.upsert_documents', size=lambda self, collection_name, documents, *args, **kwargs: len(documents))
+    def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str]
+    ):
+        if not ids:
+            return
+        # An id repeated within the batch keeps its last occurrence, as in Chroma.
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+        new_emb = self.embed(documents)
+        with self._lock:
+            collection = self._collection(collection_name)
+            embeddings = collection.reserve(len(collection) + len(ids), new_emb.shape[1])
+            for doc, meta, doc_id, vec in zip(documents, metadatas, ids, new_emb):
+                row = collection.row_of.get(doc_id)
+                if row is None:
+                    row = collection.row_of[doc_id] = len(collection.ids)
+                    collection.ids.append(doc_id)
+                    collection.documents.append(doc)
+                    collection.metadatas.append(meta)
+                else:
+                    collection.documents[row] = doc
+                    collection.metadatas[row] = meta
+                embeddings[row] = vec
+            collection.commit(self._deferred > 0)
+
+    def delete_documents(self, collection_name: str, ids: List[str]):
+        if not ids:
+            return
+        with self._lock:
+            collection = self._collection(collection_name)
+            drop = {collection.row_of[doc_id] for doc_id in ids if doc_id in collection.row_of}
+            if not drop:
+                return
+            keep = np.asarray([row for row in range(len(collection)) if row not in drop], dtype=np.int64)
+            collection.keep_rows(keep)
+            collection.commit(self._deferred > 0)
+
+    def get_metadatas(self, collection_name: str) -> Dict[str, Dict]:
+        collection = self._collection(collection_name)
+        return dict(zip(collection.ids, collection.metadatas))
+
+    def get_documents(self, collection_name: str) -> Dict[str, List]:
+        """Every document in the collection as {'ids', 'documents', 'metadatas'} lists."""
+        collection = self._collection(collection_name)
+        return {
+            'ids': list(collection.ids),
+            'documents': list(collection.documents),
+            'metadatas': list(collection.metadatas)
+        }
+
+    @timed('vector_store.query')
+    def query(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        return self.query_many(collection_name, query_texts=[query_text], n_results=n_results, where=where)
+
+    @timed('vector_store.query_many', size=lambda self, collection_name, query_texts=None, query_embeddings=None, *args, **kwargs: len(query_texts if query_texts is not None else query_embeddings))
+    def query_many(
+        self,
+        collection_name: str,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings=None,
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """Exact top-k cosine search; returns the same nested-list shape as Chroma."""
+        if query_embeddings is None:
+            query_embeddings = self.embed(query_texts or [])
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        collection = self._collection(collection_name)
+        ids, documents, metadatas, embeddings = collection.ids, collection.documents, collection.metadatas, collection.embeddings
+
+        rows = collection.select(where)
+        candidates = embeddings if rows is None else embeddings[rows]
+
+        out = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        k = min(n_results, len(candidates))
+        if k == 0:
+            for _ in range(len(queries)):
+                for field in out:
+                    out[field].append([])
+            return out
+
+        scores = queries @ np.asarray(candidates).T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for q in range(len(queries)):
+            order = top[q][np.argsort(-scores[q, top[q]], kind='stable')]
+            hits = order if rows is None else rows[order]
+            out['ids'].append([ids[i] for i in hits])
+            out['documents'].append([documents[i] for i in hits])
+            out['metadatas'].append([metadatas[i] for i in hits])
+            out['distances'].append((1.0 - scores[q, order]).tolist())
+        return out
+
+    def delete_collection(self, collection_name: str):
+        with self._lock:
+            collection = self._collection(collection_name)
+            shutil.rmtree(collection.directory, ignore_errors=True)
+            name = "product_master" if collection_name == "product_master" else "knowledge_base"
+            self._collections[name] = _Collection(collection.directory)
+
+    def reset_collection(self, collection_name: str):
+        self.delete_collection(collection_name)
+
+    def get_version(self, collection_name: str) -> int:
+        return self.versions.get(collection_name)
+
+    def bump_version(self, collection_name: str) -> int:
+        return self.versions.bump(collection_name)
+
+    def get_collection_count(self, collection_name: str) -> int:
+        return len(self._collection(collection_name))
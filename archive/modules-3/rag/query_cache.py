@@ -0,0 +1,123 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def make_key(
+    collection_name: str,
+    query: str,
+    n_results: int,
+    where: Optional[Dict],
+    version: int
+) -> Hashable:
+    """
+    Cache key for a retrieval. The collection version is part of the key, so
+    re-indexing a collection makes all of its older entries unreachable.
+    """
+    normalized = re.sub(r'\s+', ' ', query).strip()
+    where_key = json.dumps(where, sort_keys=True) if where else None
+    return (collection_name, version, normalized, n_results, where_key)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for retrieval results.
+
+    Args:
+        max_size: Maximum number of cached queries
+        ttl: Seconds an entry stays valid (None disables expiry)
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: Optional[float] = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                stored_at, value = item
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class CollectionVersions:
+    """
+    Per-collection version counters persisted in <directory>/versions.json.
+
+    The indexer bumps a collection's version after writing to it; readers in
+    any process pick the change up on their next lookup (the file is re-read
+    only when its mtime changes).
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, 'versions.json')
+        self._mtime: Optional[float] = None
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, collection_name: str) -> int:
+        with self._lock:
+            self._refresh()
+            return self._versions.get(collection_name, 0)
+
+    def bump(self, collection_name: str) -> int:
+        with self._lock:
+            self._refresh()
+            self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as fp:
+                json.dump(self._versions, fp)
+            os.replace(tmp_path, self.path)
+            self._mtime = None
+            return self._versions[collection_name]
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fp:
+                self._versions = json.load(fp)
+            self._mtime = mtime
+        except (OSError, ValueError):
+            pass
@@ -1,9 +1,43 @@
-from typing import List, Dict, Optional
-from .vector_store import VectorStore
+import os
+import threading
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+from .backends import create_vector_store
+from .lexical_index import LexicalIndex, get_lexical_index, reciprocal_rank_fusion
+from .query_cache import QueryCache, make_key
+from ..utils import metrics
+
+if TYPE_CHECKING:
+    from .vector_store import VectorStore
+
+def _copy_results(results: List[Dict]) -> List[Dict]:
+    """Copy of a result list (down to each result's metadata), so callers cannot mutate cached entries."""
+    return [{**result, 'metadata': dict(result.get('metadata') or {})} for result in results]
 
 class Retriever:
-    def __init__(self, vector_store: Optional[VectorStore] = None):
-        self.vector_store = vector_store or VectorStore()
+    """
+    Args:
+        vector_store: Store to query (create_vector_store() by default)
+        cache: Optional QueryCache for formatted results. Entries are keyed by
+            collection version, so they are invalidated when the indexer bumps it.
+        hybrid: Use the lexical index for product facts (default: RAG_HYBRID
+            env var, on unless set to "false"). A query that names a SKU or
+            CNPN returns exactly those products without a vector query; other
+            queries fuse BM25 and vector rankings with reciprocal rank fusion.
+        candidates: Results taken from each ranking before fusion
+    """
+    def __init__(
+        self,
+        vector_store: Optional['VectorStore'] = None,
+        cache: Optional[QueryCache] = None,
+        hybrid: Optional[bool] = None,
+        candidates: int = 20
+    ):
+        self.vector_store = vector_store or create_vector_store()
+        self.cache = cache
+        if hybrid is None:
+            hybrid = os.getenv('RAG_HYBRID', 'true').lower() != 'false'
+        self.hybrid = hybrid
+        self.candidates = candidates
     
     def retrieve_product_facts(
         self,
@@ -13,27 +47,24 @@ class Retriever:
     ) -> List[Dict]:
         where = {"sku": sku_filter} if sku_filter else None
         
-        results = self.vector_store.query(
-            collection_name="product_master",
-            query_text=query,
-            n_results=n_results,
-            where=where
-        )
+        key = self._cache_key("product_master", query, n_results, where)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return _copy_results(cached)
         
-        facts = []
-        if results['documents'] and len(results['documents']) > 0:
-            for i, doc in enumerate(results['documents'][0]):
-                metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                distance = results['distances'][0][i] if results['distances'] else None
-                
-                facts.append({
-                    'text': doc,
-                    'metadata': metadata,
-                    'relevance_score': 1 - distance if distance is not None else 0.0,
-                    'source': 'Product_Master',
-                    'citation': f"{metadata.get('sku', 'N/A')} - {metadata.get('product_name', 'N/A')}"
-                })
+        index = self._lexical_index()
+        facts = self._exact_product_facts(index, query, n_results, sku_filter)
+        if facts is None:
+            results = self.vector_store.query(
+                collection_name="product_master",
+                query_text=query,
+                n_results=self._n_candidates(index, n_results),
+                where=where
+            )
+            facts = self._fuse_product_facts(index, query, results, 0, n_results, where)
         
+        if key:
+            self.cache.put(key, _copy_results(facts))
         return facts
     
     def retrieve_knowledge(
@@ -41,26 +72,20 @@ class Retriever:
         query: str,
         n_results: int = 3
     ) -> List[Dict]:
+        key = self._cache_key("knowledge_base", query, n_results, None)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return _copy_results(cached)
+        
         results = self.vector_store.query(
             collection_name="knowledge_base",
             query_text=query,
             n_results=n_results
         )
         
-        knowledge = []
-        if results['documents'] and len(results['documents']) > 0:
-            for i, doc in enumerate(results['documents'][0]):
-                metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                distance = results['distances'][0][i] if results['distances'] else None
-                
-                knowledge.append({
-                    'text': doc,
-                    'metadata': metadata,
-                    'relevance_score': 1 - distance if distance is not None else 0.0,
-                    'source': 'Knowledge_Base',
-                    'citation': metadata.get('filename', 'N/A')
-                })
-        
+        knowledge = self._format_knowledge(results, 0)
+        if key:
+            self.cache.put(key, _copy_results(knowledge))
         return knowledge
     
     def retrieve_all(
@@ -73,3 +98,189 @@ class Retriever:
             'product_facts': self.retrieve_product_facts(query, n_product_facts),
             'knowledge': self.retrieve_knowledge(query, n_knowledge)
         }
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        n_product_facts: int = 3,
+        n_knowledge: int = 2
+    ) -> List[Dict[str, List[Dict]]]:
+        """
+        retrieve_all for many queries at once: every query is embedded in a
+        single call and each collection is queried once for the whole batch.
+        
+        Returns:
+            One {'product_facts': [...], 'knowledge': [...]} dict per query, in order
+        """
+        if not queries:
+            return []
+        
+        out = [{} for _ in queries]
+        pending = {
+            "product_master": ('product_facts', n_product_facts, self._format_product_facts),
+            "knowledge_base": ('knowledge', n_knowledge, self._format_knowledge)
+        }
+        
+        misses = {}
+        index = self._lexical_index()
+        for collection_name, (field, n_results, _) in pending.items():
+            for q, query in enumerate(queries):
+                key = self._cache_key(collection_name, query, n_results, None)
+                cached = self.cache.get(key) if key else None
+                if cached is not None:
+                    cached = _copy_results(cached)
+                elif collection_name == "product_master":
+                    cached = self._exact_product_facts(index, query, n_results)
+                    if cached is not None and key:
+                        self.cache.put(key, _copy_results(cached))
+                if cached is not None:
+                    out[q][field] = cached
+                else:
+                    misses.setdefault(collection_name, []).append((q, key))
+        
+        if not misses:
+            return out
+        
+        # Embed each distinct missing query once, shared by both collections.
+        missing_q = sorted({q for entries in misses.values() for q, _ in entries})
+        embeddings = dict(zip(missing_q, self.vector_store.embed([queries[q] for q in missing_q])))
+        
+        for collection_name, entries in misses.items():
+            field, n_results, formatter = pending[collection_name]
+            is_product = collection_name == "product_master"
+            results = self.vector_store.query_many(
+                collection_name=collection_name,
+                query_embeddings=[embeddings[q] for q, _ in entries],
+                n_results=self._n_candidates(index, n_results) if is_product else n_results
+            )
+            for row, (q, key) in enumerate(entries):
+                if is_product:
+                    out[q][field] = self._fuse_product_facts(index, queries[q], results, row, n_results)
+                else:
+                    out[q][field] = formatter(results, row)
+                if key:
+                    self.cache.put(key, _copy_results(out[q][field]))
+        
+        return out
+    
+    def _lexical_index(self) -> Optional[LexicalIndex]:
+        if not self.hybrid:
+            return None
+        index = get_lexical_index(self.vector_store, "product_master")
+        return index if index is not None and len(index) else None
+    
+    def _n_candidates(self, index: Optional[LexicalIndex], n_results: int) -> int:
+        return max(n_results, self.candidates) if index is not None else n_results
+    
+    def _exact_product_facts(
+        self,
+        index: Optional[LexicalIndex],
+        query: str,
+        n_results: int,
+        sku_filter: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        """Facts for the SKUs/CNPNs named in the query (or sku_filter), or None if there are none."""
+        if index is None:
+            return None
+        rows = index.rows_for('sku', sku_filter) if sku_filter else index.match_identifiers(query)
+        if not rows:
+            return None
+        metrics.inc('retriever_queries_total', 1, {'path': 'exact'})
+        return [
+            self._product_fact(index.documents[row], index.metadatas[row], 1.0, 'exact')
+            for row in rows[:n_results]
+        ]
+    
+    def _fuse_product_facts(
+        self,
+        index: Optional[LexicalIndex],
+        query: str,
+        results: Dict,
+        q: int,
+        n_results: int,
+        where: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Reciprocal rank fusion of the vector results for query q with BM25 over the lexical index."""
+        vector_facts = self._format_product_facts(results, q)
+        if index is None or where:
+            metrics.inc('retriever_queries_total', 1, {'path': 'vector'})
+            return vector_facts[:n_results]
+        
+        metrics.inc('retriever_queries_total', 1, {'path': 'hybrid'})
+        by_id: Dict[str, Tuple[str, Dict, float]] = {}
+        vector_ranking = []
+        ids = results['ids'][q] if results.get('ids') and len(results['ids']) > q else []
+        for doc_id, fact in zip(ids, vector_facts):
+            by_id[doc_id] = (fact['text'], fact['metadata'], fact['relevance_score'])
+            vector_ranking.append(doc_id)
+        lexical_ranking = []
+        for row, _ in index.bm25(query, self._n_candidates(index, n_results)):
+            doc_id = index.ids[row]
+            by_id.setdefault(doc_id, (index.documents[row], index.metadatas[row], 0.0))
+            lexical_ranking.append(doc_id)
+        
+        facts = []
+        for doc_id, score in reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:n_results]:
+            doc, metadata, similarity = by_id[doc_id]
+            fact = self._product_fact(doc, metadata, similarity, 'hybrid')
+            fact['fusion_score'] = score
+            facts.append(fact)
+        return facts
+    
+    def _cache_key(self, collection_name: str, query: str, n_results: int, where: Optional[Dict]):
+        if self.cache is None:
+            return None
+        version = self.vector_store.get_version(collection_name)
+        return make_key(collection_name, query, n_results, where, version)
+    
+    @staticmethod
+    def _rows(results: Dict, q: int):
+        if not results.get('documents') or len(results['documents']) <= q:
+            return
+        for i, doc in enumerate(results['documents'][q]):
+            metadata = results['metadatas'][q][i] if results.get('metadatas') else {}
+            distance = results['distances'][q][i] if results.get('distances') else None
+            yield doc, metadata, distance
+    
+    def _format_product_facts(self, results: Dict, q: int) -> List[Dict]:
+        return [
+            self._product_fact(doc, metadata, 1 - distance if distance is not None else 0.0)
+            for doc, metadata, distance in self._rows(results, q)
+        ]
+    
+    @staticmethod
+    def _product_fact(doc: str, metadata: Dict, relevance_score: float, match: str = 'vector') -> Dict:
+        return {
+            'text': doc,
+            'metadata': metadata,
+            'relevance_score': relevance_score,
+            'source': 'Product_Master',
+            'citation': f"{metadata.get('sku', 'N/A')} - {metadata.get('product_name', 'N/A')}",
+            'match': match
+        }
+    
+    def _format_knowledge(self, results: Dict, q: int) -> List[Dict]:
+        return [
+            {
+                'text': doc,
+                'metadata': metadata,
+                'relevance_score': 1 - distance if distance is not None else 0.0,
+                'source': 'Knowledge_Base',
+                'citation': metadata.get('filename', 'N/A')
+            }
+            for doc, metadata, distance in self._rows(results, q)
+        ]
+
+_shared_retriever: Optional[Retriever] = None
+_shared_lock = threading.Lock()
+
+def get_retriever() -> Retriever:
+    """
+    Process-wide Retriever with a query cache, so the vector store client is
+    built once and repeated queries (SKUs, boilerplate) are served from memory.
+    """
+    global _shared_retriever
+    with _shared_lock:
+        if _shared_retriever is None:
+            _shared_retriever = Retriever(cache=QueryCache())
+        return _shared_retriever
@@ -1,30 +1,143 @@
 import chromadb
+import chromadb.errors
 from chromadb.config import Settings
+from chromadb.api.types import EmbeddingFunction
+from chromadb.utils import embedding_functions
+import contextlib
 import os
-from typing import List, Dict, Optional
+import threading
+import warnings
+from typing import Callable, List, Dict, Optional, Tuple
 import hashlib
+import json
+import numpy as np
+from ..dedupe.embedding_cache import EmbeddingCache, get_embedding_cache
+from .query_cache import CollectionVersions
+from ..utils.metrics import timed
+
+# What Chroma raises for a handle whose collection no longer exists
+# (InvalidCollectionException before chromadb 0.6, NotFoundError since).
+_STALE_COLLECTION_ERRORS = tuple(
+    getattr(chromadb.errors, name)
+    for name in ('NotFoundError', 'InvalidCollectionException')
+    if hasattr(chromadb.errors, name)
+)
+
+DEFAULT_EMBEDDING_MODEL = "chroma-default/all-MiniLM-L6-v2"
+
+def _embedder_namespace(base) -> str:
+    """Cache namespace for a custom embedder: its class plus its config or model name."""
+    cls = f"{type(base).__module__}.{type(base).__qualname__}"
+    try:
+        with warnings.catch_warnings():
+            # Legacy embedders warn and return NotImplemented.
+            warnings.simplefilter('ignore')
+            config = base.get_config()
+    except Exception:
+        config = None
+    if isinstance(config, dict):
+        digest = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return f"{cls}/{digest}"
+    model = getattr(base, 'model_name', None) or getattr(base, '_model_name', None)
+    if isinstance(model, str) and model:
+        return f"{cls}/{model}"
+    raise ValueError(f"model_name is required to cache embeddings of {cls}")
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """
+    Chroma embedding function that only sends text missing from the on-disk
+    EmbeddingCache to the wrapped model.
+
+    Vectors are cached per model_name. It defaults to Chroma's default model;
+    for a custom `base` it is derived from the embedder's class and config (or
+    model name), and must be given when neither is available, so two
+    embedders never share cached vectors.
+    """
+
+    def __init__(self, base=None, model_name: Optional[str] = None, cache: Optional[EmbeddingCache] = None):
+        if base is None:
+            base = embedding_functions.DefaultEmbeddingFunction()
+            model_name = model_name or DEFAULT_EMBEDDING_MODEL
+        self.base = base
+        self.model_name = model_name or _embedder_namespace(base)
+        self.cache = cache or get_embedding_cache(self.model_name)
+
+    def __call__(self, input):
+        vectors = self.cache.get_or_compute(list(input), self._encode)
+        return vectors.tolist()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.base(texts), dtype=np.float32)
 
 class VectorStore:
-    def __init__(self, persist_directory: str = "export/.cache/chromadb"):
+    def __init__(
+        self,
+        persist_directory: str = "export/.cache/chromadb",
+        embedding_function: Optional[EmbeddingFunction] = None
+    ):
         os.makedirs(persist_directory, exist_ok=True)
         
         self.client = chromadb.Client(Settings(
             persist_directory=persist_directory,
             anonymized_telemetry=False
         ))
+        self.embedding_function = embedding_function or CachedEmbeddingFunction()
+        self.versions = CollectionVersions(persist_directory)
         
-        self.product_collection = self._get_or_create_collection("product_master")
-        self.knowledge_collection = self._get_or_create_collection("knowledge_base")
+        # name -> (collection version when opened, collection handle)
+        self._handles: Dict[str, Tuple[int, object]] = {}
+        self._handles_lock = threading.Lock()
+        self._collection("product_master")
+        self._collection("knowledge_base")
+    
+    @property
+    def product_collection(self):
+        return self._collection("product_master")
+    
+    @property
+    def knowledge_collection(self):
+        return self._collection("knowledge_base")
+    
+    def _collection(self, collection_name: str, reopen: bool = False):
+        """
+        Collection handle, re-opened when the collection version changes: the
+        indexer (possibly another VectorStore or process) deletes and
+        re-creates a collection on a full re-index, which leaves old handles
+        pointing at a collection that no longer exists.
+        """
+        name = "product_master" if collection_name == "product_master" else "knowledge_base"
+        version = self.get_version(name)
+        with self._handles_lock:
+            handle = self._handles.get(name)
+            if reopen or handle is None or handle[0] != version:
+                handle = (version, self._get_or_create_collection(name))
+                self._handles[name] = handle
+            return handle[1]
+    
+    def _call(self, collection_name: str, op: Callable):
+        """
+        Run op(collection); if the handle has gone stale since the last version
+        check (the collection was deleted or re-created), re-open it once and
+        retry. Any other error is raised as is: a failed add or delete may have
+        partly applied, so it is not repeated.
+        """
+        try:
+            return op(self._collection(collection_name))
+        except _STALE_COLLECTION_ERRORS as e:
+            print(f"[RAG] Re-opening {collection_name}: {e}")
+            return op(self._collection(collection_name, reopen=True))
     
     def _get_or_create_collection(self, name: str):
         try:
-            return self.client.get_collection(name)
+            return self.client.get_collection(name, embedding_function=self.embedding_function)
         except:
             return self.client.create_collection(
                 name=name,
-                metadata={"hnsw:space": "cosine"}
+                metadata={"hnsw:space": "cosine"},
+                embedding_function=self.embedding_function
             )
     
+    @timed('vector_store.add_documents', size=lambda self, collection_name, documents, *args, **kwargs: len(documents))
     def add_documents(
         self,
         collection_name: str,
@@ -32,17 +145,49 @@ class VectorStore:
         metadatas: List[Dict],
         ids: Optional[List[str]] = None
     ):
-        collection = self.product_collection if collection_name == "product_master" else self.knowledge_collection
-        
         if ids is None:
             ids = [hashlib.md5(doc.encode()).hexdigest() for doc in documents]
         
-        collection.add(
+        self._call(collection_name, lambda collection: collection.add(
             documents=documents,
             metadatas=metadatas,
             ids=ids
-        )
+        ))
     
+    @timed('vector_store.upsert_documents', size=lambda self, collection_name, documents, *args, **kwargs: len(documents))
+    def upsert_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        ids: List[str]
+    ):
+        self._call(collection_name, lambda collection: collection.upsert(
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        ))
+    
+    def delete_documents(self, collection_name: str, ids: List[str]):
+        if not ids:
+            return
+        self._call(collection_name, lambda collection: collection.delete(ids=ids))
+    
+    def get_metadatas(self, collection_name: str) -> Dict[str, Dict]:
+        """Map of id -> metadata for every document in the collection."""
+        results = self._call(collection_name, lambda collection: collection.get(include=["metadatas"]))
+        return dict(zip(results['ids'], results['metadatas'] or [{}] * len(results['ids'])))
+    
+    def get_documents(self, collection_name: str) -> Dict[str, List]:
+        """Every document in the collection as {'ids', 'documents', 'metadatas'} lists."""
+        results = self._call(collection_name, lambda collection: collection.get(include=["documents", "metadatas"]))
+        return {
+            'ids': results['ids'],
+            'documents': results['documents'] or [''] * len(results['ids']),
+            'metadatas': results['metadatas'] or [{}] * len(results['ids'])
+        }
+    
+    @timed('vector_store.query')
     def query(
         self,
         collection_name: str,
@@ -50,15 +195,33 @@ class VectorStore:
         n_results: int = 5,
         where: Optional[Dict] = None
     ) -> Dict:
-        collection = self.product_collection if collection_name == "product_master" else self.knowledge_collection
-        
-        results = collection.query(
+        return self._call(collection_name, lambda collection: collection.query(
             query_texts=[query_text],
             n_results=n_results,
             where=where
-        )
+        ))
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embedding_function(list(texts))
+    
+    @timed('vector_store.query_many', size=lambda self, collection_name, query_texts=None, query_embeddings=None, *args, **kwargs: len(query_texts if query_texts is not None else query_embeddings))
+    def query_many(
+        self,
+        collection_name: str,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """One vectorized query for several texts (or precomputed embeddings)."""
+        if query_embeddings is None:
+            query_embeddings = self.embed(query_texts or [])
         
-        return results
+        return self._call(collection_name, lambda collection: collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
+        ))
     
     def delete_collection(self, collection_name: str):
         try:
@@ -68,11 +231,18 @@ class VectorStore:
     
     def reset_collection(self, collection_name: str):
         self.delete_collection(collection_name)
-        if collection_name == "product_master":
-            self.product_collection = self._get_or_create_collection(collection_name)
-        else:
-            self.knowledge_collection = self._get_or_create_collection(collection_name)
+        self._collection(collection_name, reopen=True)
+    
+    def bulk_write(self):
+        """Same interface as NumpyVectorStore.bulk_write; Chroma persists each write itself."""
+        return contextlib.nullcontext()
+
+    def get_version(self, collection_name: str) -> int:
+        return self.versions.get(collection_name)
+    
+    def bump_version(self, collection_name: str) -> int:
+        """Invalidate cached query results for the collection (see Retriever)."""
+        return self.versions.bump(collection_name)
     
     def get_collection_count(self, collection_name: str) -> int:
-        collection = self.product_collection if collection_name == "product_master" else self.knowledge_collection
-        return collection.count()
+        return self._call(collection_name, lambda collection: collection.count())
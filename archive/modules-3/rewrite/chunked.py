@@ -0,0 +1,114 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.io_utils import chunk_text
+from .executor import RewriteExecutor
+from .rewrite import _load_yaml, rewrite_with_rag
+
+LIST_FIELDS = ("headings", "claims", "numbers", "warnings", "citations")
+
+
+def _disclaimers(tone_path: str, lang: str) -> List[str]:
+    """Mandatory disclaimer(s) the system prompt asks the model to append."""
+    try:
+        tone = _load_yaml(tone_path)
+        value = tone['claims']['mandatory_disclaimers']['cosmetics'][lang.lower()[:2]]
+    except (OSError, KeyError, TypeError):
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [str(v).strip() for v in values if v and str(v).strip()]
+
+
+def _strip_disclaimers(text: str, disclaimers: List[str]) -> str:
+    for disclaimer in disclaimers:
+        pattern = r'\s+'.join(re.escape(word) for word in disclaimer.split())
+        text = re.sub(pattern, '', text)
+    return text.strip()
+
+
+def _merge_metadata(parts: List[Optional[Dict]]) -> Dict:
+    """Concatenate the list fields of per-chunk metadata in order, dropping repeats."""
+    merged: Dict = {field: [] for field in LIST_FIELDS}
+    seen = {field: set() for field in LIST_FIELDS}
+    for meta in parts:
+        for key, value in (meta or {}).items():
+            if key in LIST_FIELDS:
+                for item in value if isinstance(value, list) else [value]:
+                    marker = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+                    if marker not in seen[key]:
+                        seen[key].add(marker)
+                        merged[key].append(item)
+            else:
+                merged.setdefault(key, value)
+    merged['chunks'] = len(parts)
+    return merged
+
+
+def rewrite_chunked(
+    text: str,
+    lang: str,
+    doc_type: str = "Document",
+    tone_path: str = "configs/tone.yaml",
+    prompts_path: str = "configs/prompts.yaml",
+    use_rag: bool = True,
+    max_chars: int = 4000,
+    max_workers: int = 8,
+    cache_mode: Optional[str] = None
+) -> Tuple[str, Dict]:
+    """
+    Rewrite a long document chunk by chunk, in parallel.
+
+    The text is split with chunk_text(max_chars); facts are retrieved for all
+    chunks in one Retriever.retrieve_batch call; the chunks are rewritten
+    concurrently and joined back in their original order. The disclaimer
+    each chunk's response carries is removed and appended once at the end,
+    and the per-chunk metadata is merged into one dict.
+
+    Texts that fit in one chunk go straight to rewrite_with_rag.
+
+    Returns:
+        Tuple of (rewritten_text, merged_metadata)
+
+    Raises:
+        RuntimeError: If any chunk fails to rewrite
+    """
+    chunks = [c for c in chunk_text(text, max_chars) if c.strip()]
+    if len(chunks) <= 1:
+        return rewrite_with_rag(
+            text, lang, doc_type, tone_path, prompts_path,
+            use_rag=use_rag, cache_mode=cache_mode
+        )
+
+    rag_results: List[Optional[Dict]] = [None] * len(chunks)
+    if use_rag and os.getenv('RAG_ENABLED', 'false').lower() == 'true':
+        try:
+            from modules.rag import get_retriever
+            rag_results = get_retriever().retrieve_batch([c[:1000] for c in chunks])
+        except Exception as e:
+            print(f"RAG retrieval failed: {e}, continuing without RAG")
+
+    jobs = [
+        dict(
+            text=chunk, lang=lang, doc_type=doc_type,
+            tone_path=tone_path, prompts_path=prompts_path,
+            # Retrieval already happened (or failed) for the whole batch
+            use_rag=False, rag_results=rag_results[i],
+            cache_mode=cache_mode
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    print(f"[REWRITE] {doc_type}: {len(text)} chars in {len(chunks)} chunks")
+    results = RewriteExecutor(max_workers=max_workers).run(jobs)
+
+    failed = [r['index'] for r in results if r['error']]
+    if failed:
+        raise RuntimeError(f"Rewrite failed for chunks {failed}: {results[failed[0]]['error']}")
+
+    disclaimers = _disclaimers(tone_path, lang)
+    body = "\n\n".join(_strip_disclaimers(r['text'], disclaimers) for r in results)
+    if disclaimers:
+        body = body + "\n\n" + "\n".join(disclaimers)
+
+    return body, _merge_metadata([r['metadata'] for r in results])
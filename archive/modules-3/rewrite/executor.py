@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .llm_cache import cache_mode, get_llm_cache
+from .rewrite import rewrite_with_rag
+
+
+class RewriteExecutor:
+    """
+    Runs many rewrite_with_rag jobs concurrently on a thread pool.
+
+    LLM calls spend nearly all of their time waiting on the network, so
+    threads overlap them well. All workers share the keep-alive session and
+    the process-wide rate limiter from call_llm, so raising max_workers never
+    pushes the request or token rate past LLM_RPM / LLM_TPM.
+
+    Args:
+        max_workers: Number of jobs in flight at once
+        on_result: Optional callback invoked with each result as it completes
+        progress_every: Print a progress line every N completed jobs
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        progress_every: int = 10
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.on_result = on_result
+        self.progress_every = max(1, int(progress_every))
+
+    def _run_job(self, index: int, job: Dict) -> Dict:
+        start = time.perf_counter()
+        try:
+            text, metadata = rewrite_with_rag(**job)
+            error = None
+        except Exception as e:
+            text, metadata, error = None, None, str(e)
+        return {
+            'index': index,
+            'text': text,
+            'metadata': metadata,
+            'error': error,
+            'latency': time.perf_counter() - start
+        }
+
+    def run(self, jobs: List[Dict]) -> List[Dict]:
+        """
+        Run jobs (keyword arguments for rewrite_with_rag) and return one result
+        per job, in input order.
+
+        Returns:
+            List of dicts with index, text, metadata, error and latency (seconds).
+            A failed job has error set and text/metadata None; it does not stop
+            the others.
+        """
+        total = len(jobs)
+        results: List[Optional[Dict]] = [None] * total
+        if not total:
+            return []
+
+        start = time.perf_counter()
+        done = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, total)) as pool:
+            futures = [pool.submit(self._run_job, i, job) for i, job in enumerate(jobs)]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result['index']] = result
+                done += 1
+                status = "failed: " + result['error'] if result['error'] else "ok"
+                print(f"[REWRITE] job {result['index']} {status} in {result['latency']:.2f}s")
+                if done % self.progress_every == 0 or done == total:
+                    elapsed = time.perf_counter() - start
+                    print(f"[REWRITE] {done}/{total} done, {elapsed:.1f}s elapsed, {done / elapsed:.2f} jobs/s")
+                if self.on_result is not None:
+                    self.on_result(result)
+
+        latencies = np.array([r['latency'] for r in results])
+        failed = sum(1 for r in results if r['error'])
+        print(
+            f"[REWRITE] finished {total} jobs ({failed} failed) in {time.perf_counter() - start:.1f}s, "
+            f"latency p50 {np.percentile(latencies, 50):.2f}s p95 {np.percentile(latencies, 95):.2f}s"
+        )
+        if cache_mode() != "bypass":
+            stats = get_llm_cache().stats()
+            print(f"[LLM CACHE] {stats['hits']} hits / {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}), {stats['entries']} entries")
+        return results
+
+
+def rewrite_many(
+    texts: List[str],
+    lang: str,
+    doc_type: str = "Document",
+    max_workers: int = 8,
+    **kwargs
+) -> List[Dict]:
+    """
+    Rewrite every text concurrently with rewrite_with_rag.
+
+    Extra keyword arguments (tone_path, prompts_path, use_rag) are passed to
+    every job. See RewriteExecutor.run for the result format.
+    """
+    jobs = [dict(text=text, lang=lang, doc_type=doc_type, **kwargs) for text in texts]
+    return RewriteExecutor(max_workers=max_workers).run(jobs)
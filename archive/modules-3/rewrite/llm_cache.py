@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+CACHE_MODES = ("use", "bypass", "refresh")
+
+
+def request_key(model: str, base_url: str, messages: List[Dict], temperature: float) -> str:
+    """Cache key for a chat completion: sha256 over model, endpoint, messages and temperature."""
+    payload = json.dumps(
+        {'model': model, 'base': base_url.rstrip('/'), 'messages': messages, 'temperature': temperature},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent SQLite cache of LLM responses keyed by request_key().
+
+    Identical requests (same model, endpoint, messages and temperature)
+    return the stored completion instead of calling the API. When the stored
+    responses exceed max_bytes, the least recently used ones are evicted down
+    to 90% of the limit. The database runs in WAL mode, so several processes
+    can share it.
+
+    Args:
+        path: SQLite database file
+        max_bytes: Size bound for the stored response text
+    """
+
+    def __init__(self, path: str = "export/.cache/llm/responses.sqlite", max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = ""):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        drop = []
+        for key, size in rows:
+            if total <= target:
+                break
+            drop.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", drop)
+        print(f"[LLM CACHE] evicted {len(drop)} responses")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': total,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide response cache at LLM_CACHE_PATH (default export/.cache/llm/responses.sqlite)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                path=os.getenv('LLM_CACHE_PATH', 'export/.cache/llm/responses.sqlite'),
+                max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', '512')) * 1024 * 1024
+            )
+        return _cache
+
+
+def cache_mode(mode: Optional[str] = None) -> str:
+    """
+    Resolve the cache mode: an explicit argument wins, then LLM_CACHE_MODE.
+
+    "use" reads and writes the cache, "refresh" skips the lookup but stores
+    the new response, "bypass" does neither.
+    """
+    mode = (mode or os.getenv('LLM_CACHE_MODE', 'use')).lower()
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown LLM cache mode {mode!r}; expected one of {CACHE_MODES}")
+    return mode
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute / 60` units per second,
+    holding at most `per_minute` units. A limit of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Shared requests-per-minute and tokens-per-minute limiter for LLM calls.
+
+    Every thread calling the API acquires from the same two buckets, so the
+    combined request rate stays under the provider limits no matter how many
+    workers run. A 429 with Retry-After pauses all callers, not just the one
+    that was rejected.
+
+    Args:
+        rpm: Requests per minute (0 disables the limit)
+        tpm: Tokens per minute (0 disables the limit)
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request and `tokens` tokens are available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(tokens, now)
+                )
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return time.monotonic() - start
+                self._cond.wait(wait)
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Correct the token bucket once the real usage of a request is known."""
+        if actual is None:
+            return
+        with self._cond:
+            if actual > estimated:
+                self.tokens.take(actual - estimated)
+            else:
+                self.tokens.give_back(estimated - actual)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every caller for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter configured from LLM_RPM / LLM_TPM (unset means unlimited)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                rpm=float(os.getenv('LLM_RPM', '0') or 0),
+                tpm=float(os.getenv('LLM_TPM', '0') or 0)
+            )
+        return _limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    """Replace the process-wide limiter (None re-reads the environment on next use)."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count (~4 characters per token) used before the API reports usage."""
+    return sum(len(t or '') for t in texts) // 4 + 1
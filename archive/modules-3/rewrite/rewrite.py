@@ -1,6 +1,9 @@
-import os, json, re
-from typing import Dict, Optional, Tuple
+import os, json, re, random, threading, time
+from typing import Dict, Iterator, Optional, Tuple
 import yaml
+from .llm_cache import cache_mode as _cache_mode, get_llm_cache, request_key
+from .rate_limit import estimate_tokens, get_rate_limiter
+from ..utils import metrics
 
 def _load_yaml(path: str) -> Dict:
     with open(path, 'r', encoding='utf-8') as fp:
@@ -19,11 +22,40 @@ Always include this disclaimer at the end: {disclaimers}.
 Keep claims cosmetic, avoid medical promises. Standardize numbers/dates.
 """
 
-def call_llm(prompt: str, text: str, model: str = None, max_retries: int = 3) -> str:
-    # Generic OpenAI-compatible REST call with retry logic for rate limits
-    import requests
-    import time
-    
+_session = None
+_session_lock = threading.Lock()
+
+def _get_session():
+    """Shared keep-alive HTTP session, sized so every worker thread gets a pooled connection."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            pool_size = int(os.getenv('LLM_POOL_SIZE', '32'))
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), if present."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _chat_request(prompt: str, text: str, model: Optional[str]) -> Tuple[str, str, Dict, Dict]:
+    """(base_url, model, headers, payload) for an OpenAI-compatible chat completion."""
     api_key = os.getenv('OPENAI_API_KEY')
     base = os.getenv('OPENAI_BASE_URL','https://api.openai.com/v1')
     model = model or os.getenv('MODEL_NAME','gpt-4o-mini')
@@ -36,49 +68,165 @@ def call_llm(prompt: str, text: str, model: str = None, max_retries: int = 3) ->
         ],
         "temperature": 0.2
     }
+    return base, model, headers, payload
+
+def _post_with_retries(base: str, headers: Dict, payload: Dict, estimated: int, max_retries: int, stream: bool = False):
+    """POST to /chat/completions through the shared session and limiter, retrying 429/503."""
+    import requests
+    
+    session = _get_session()
+    limiter = get_rate_limiter()
     
     for attempt in range(max_retries):
+        waited = limiter.acquire(estimated)
+        metrics.observe('llm_rate_limit_wait_seconds', waited)
+        metrics.inc('llm_requests_total')
         try:
-            r = requests.post(f"{base}/chat/completions", headers=headers, 
-                            data=json.dumps(payload), timeout=120)
+            r = session.post(f"{base}/chat/completions", headers=headers, 
+                            data=json.dumps(payload), timeout=120, stream=stream)
             r.raise_for_status()
-            data = r.json()
-            return data['choices'][0]['message']['content']
+            return r
         except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429 and attempt < max_retries - 1:
-                # Rate limited, wait with exponential backoff + jitter
-                import random
-                base_wait = (2 ** attempt) * 5  # 5s, 10s, 20s
-                jitter = random.uniform(0, 2)  # Add 0-2s random jitter
-                wait_time = base_wait + jitter
-                print(f"Rate limited, retrying in {wait_time:.1f}s... (attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
+            status = e.response.status_code
+            if status in (429, 503) and attempt < max_retries - 1:
+                wait_time = _retry_after(e.response)
+                if wait_time is None:
+                    # No hint from the server: exponential backoff + jitter
+                    base_wait = (2 ** attempt) * 5  # 5s, 10s, 20s
+                    wait_time = base_wait + random.uniform(0, 2)
+                # Pause every caller sharing the limiter, not just this thread
+                limiter.pause(wait_time)
+                metrics.inc('llm_retries_total', 1, {'status': str(status)})
+                print(f"Rate limited ({status}), retrying in {wait_time:.1f}s... (attempt {attempt + 1}/{max_retries})")
             else:
+                metrics.inc('llm_errors_total', 1, {'status': str(status)})
                 raise
     
     # Should never reach here, but satisfies type checker
     raise RuntimeError("LLM call failed after all retries")
 
-def rewrite_text(text: str, lang: str, tone_path: str) -> str:
-    tone = _load_yaml(tone_path)
-    system = build_system_prompt(tone, lang=lang)
-    return call_llm(system, text)
+def _record_usage(usage: Optional[Dict]):
+    for kind in ('prompt', 'completion'):
+        value = (usage or {}).get(f'{kind}_tokens')
+        if value:
+            metrics.inc('llm_tokens_total', value, {'kind': kind})
 
-def rewrite_with_rag(
+@metrics.timed('call_llm', size=lambda prompt, text, *args, **kwargs: len(prompt) + len(text))
+def call_llm(prompt: str, text: str, model: str = None, max_retries: int = 3, cache_mode: Optional[str] = None) -> str:
+    # Generic OpenAI-compatible REST call with retry logic for rate limits.
+    # Responses are cached by request content; cache_mode is "use", "refresh"
+    # or "bypass" (default from LLM_CACHE_MODE, see llm_cache.cache_mode).
+    base, model, headers, payload = _chat_request(prompt, text, model)
+    
+    mode = _cache_mode(cache_mode)
+    if mode != "bypass":
+        cache = get_llm_cache()
+        key = request_key(model, base, payload['messages'], payload['temperature'])
+        if mode == "use":
+            cached = cache.get(key)
+            metrics.inc('llm_cache_total', 1, {'result': 'hit' if cached is not None else 'miss'})
+            if cached is not None:
+                return cached
+    
+    # Prompt plus a completion of roughly the input's length; corrected from usage below.
+    estimated = estimate_tokens(prompt, text, text)
+    r = _post_with_retries(base, headers, payload, estimated, max_retries)
+    data = r.json()
+    get_rate_limiter().settle(estimated, (data.get('usage') or {}).get('total_tokens'))
+    _record_usage(data.get('usage'))
+    content = data['choices'][0]['message']['content']
+    if mode != "bypass" and content:
+        cache.put(key, content, model)
+    return content
+
+def call_llm_stream(
+    prompt: str,
     text: str,
-    lang: str,
-    doc_type: str = "Document",
-    tone_path: str = "configs/tone.yaml",
-    prompts_path: str = "configs/prompts.yaml",
-    use_rag: bool = True
-) -> Tuple[str, Optional[Dict]]:
+    model: str = None,
+    max_retries: int = 3,
+    cache_mode: Optional[str] = None,
+    stats: Optional[Dict] = None
+) -> Iterator[str]:
     """
-    Rewrite text with RAG facts injection and structured output.
+    Streaming variant of call_llm: yields content deltas as the server sends
+    them (server-sent events, `"stream": true`).
     
-    Returns:
-        Tuple of (rewritten_text, metadata_json)
+    Args:
+        stats: Optional dict filled in place with ttft (seconds to the first
+            content token), total (seconds to the end of the stream), chars
+            and cached once the stream is exhausted.
     """
-    from modules.rag import Retriever
+    base, model, headers, payload = _chat_request(prompt, text, model)
+    stats = stats if stats is not None else {}
+    start = time.perf_counter()
+    
+    mode = _cache_mode(cache_mode)
+    if mode != "bypass":
+        cache = get_llm_cache()
+        key = request_key(model, base, payload['messages'], payload['temperature'])
+        if mode == "use":
+            cached = cache.get(key)
+            metrics.inc('llm_cache_total', 1, {'result': 'hit' if cached is not None else 'miss'})
+            if cached is not None:
+                elapsed = time.perf_counter() - start
+                stats.update(ttft=elapsed, total=elapsed, chars=len(cached), cached=True)
+                yield cached
+                return
+    
+    estimated = estimate_tokens(prompt, text, text)
+    payload = dict(payload, stream=True)
+    r = _post_with_retries(base, headers, payload, estimated, max_retries, stream=True)
+    
+    parts = []
+    usage = None
+    try:
+        for line in r.iter_lines():
+            # Decode ourselves: event streams often omit the charset header
+            line = line.decode('utf-8').strip() if line else ''
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            event = json.loads(data)
+            usage = event.get('usage') or usage
+            for choice in event.get('choices') or []:
+                delta = (choice.get('delta') or {}).get('content')
+                if delta:
+                    if not parts:
+                        stats['ttft'] = time.perf_counter() - start
+                    parts.append(delta)
+                    yield delta
+    finally:
+        r.close()
+    
+    get_rate_limiter().settle(estimated, (usage or {}).get('total_tokens'))
+    _record_usage(usage)
+    content = ''.join(parts)
+    stats.update(total=time.perf_counter() - start, chars=len(content), cached=False)
+    stats.setdefault('ttft', stats['total'])
+    metrics.observe('llm_ttft_seconds', stats['ttft'])
+    metrics.observe('llm_stream_seconds', stats['total'])
+    print(f"[LLM] streamed {len(content)} chars, ttft {stats['ttft']:.2f}s, total {stats['total']:.2f}s")
+    if mode != "bypass" and content:
+        cache.put(key, content, model)
+
+def rewrite_text(text: str, lang: str, tone_path: str, cache_mode: Optional[str] = None) -> str:
+    tone = _load_yaml(tone_path)
+    system = build_system_prompt(tone, lang=lang)
+    return call_llm(system, text, cache_mode=cache_mode)
+
+def _build_rag_prompts(
+    text: str,
+    lang: str,
+    doc_type: str,
+    tone_path: str,
+    prompts_path: str,
+    use_rag: bool,
+    rag_results: Optional[Dict]
+) -> Tuple[str, str, list]:
+    """(system_prompt, user_prompt, citations) for rewrite_with_rag and its streaming variant."""
+    from modules.rag import get_retriever
     
     tone = _load_yaml(tone_path)
     prompts = _load_yaml(prompts_path) if os.path.exists(prompts_path) else {}
@@ -90,35 +238,35 @@ def rewrite_with_rag(
     knowledge_text = ""
     citations = []
     
-    if use_rag and os.getenv('RAG_ENABLED', 'false').lower() == 'true':
+    if rag_results is None and use_rag and os.getenv('RAG_ENABLED', 'false').lower() == 'true':
         try:
-            retriever = Retriever()
+            retriever = get_retriever()
             
             rag_results = retriever.retrieve_all(
                 query=text[:1000],
                 n_product_facts=3,
                 n_knowledge=2
             )
-            
-            if rag_results['product_facts']:
-                facts_list = [f"- {fact['text'][:200]}" for fact in rag_results['product_facts'][:3]]
-                facts_text = "\n".join(facts_list)
-                citations.extend([
-                    {"source": "Product_Master", "reference": fact['citation']}
-                    for fact in rag_results['product_facts']
-                ])
-            
-            if rag_results['knowledge']:
-                knowledge_list = [f"- {kb['text'][:200]}" for kb in rag_results['knowledge'][:2]]
-                knowledge_text = "\n".join(knowledge_list)
-                citations.extend([
-                    {"source": "Knowledge_Base", "reference": kb['citation']}
-                    for kb in rag_results['knowledge']
-                ])
         except Exception as e:
             print(f"RAG retrieval failed: {e}, continuing without RAG")
-            facts_text = ""
-            knowledge_text = ""
+            rag_results = None
+    
+    if rag_results:
+        if rag_results['product_facts']:
+            facts_list = [f"- {fact['text'][:200]}" for fact in rag_results['product_facts'][:3]]
+            facts_text = "\n".join(facts_list)
+            citations.extend([
+                {"source": "Product_Master", "reference": fact['citation']}
+                for fact in rag_results['product_facts']
+            ])
+        
+        if rag_results['knowledge']:
+            knowledge_list = [f"- {kb['text'][:200]}" for kb in rag_results['knowledge'][:2]]
+            knowledge_text = "\n".join(knowledge_list)
+            citations.extend([
+                {"source": "Knowledge_Base", "reference": kb['citation']}
+                for kb in rag_results['knowledge']
+            ])
     
     prompt_template = prompts.get('user_prompt_rewrite', '')
     
@@ -140,7 +288,36 @@ def rewrite_with_rag(
         system_prompt = build_system_prompt(tone, lang=lang)
         user_prompt = f"Rewrite this text:\n\n{text}"
     
-    response = call_llm(system_prompt, user_prompt)
+    return system_prompt, user_prompt, citations
+
+def rewrite_with_rag(
+    text: str,
+    lang: str,
+    doc_type: str = "Document",
+    tone_path: str = "configs/tone.yaml",
+    prompts_path: str = "configs/prompts.yaml",
+    use_rag: bool = True,
+    rag_results: Optional[Dict] = None,
+    cache_mode: Optional[str] = None
+) -> Tuple[str, Optional[Dict]]:
+    """
+    Rewrite text with RAG facts injection and structured output.
+    
+    Args:
+        rag_results: Pre-fetched retrieval results for this text (one entry of
+            Retriever.retrieve_batch). When given, no retrieval is done here,
+            which lets callers fetch facts for many chunks in one batch.
+        cache_mode: LLM response cache mode ("use", "refresh" or "bypass");
+            defaults to LLM_CACHE_MODE.
+    
+    Returns:
+        Tuple of (rewritten_text, metadata_json)
+    """
+    system_prompt, user_prompt, citations = _build_rag_prompts(
+        text, lang, doc_type, tone_path, prompts_path, use_rag, rag_results
+    )
+    
+    response = call_llm(system_prompt, user_prompt, cache_mode=cache_mode)
     
     text_part, metadata = _extract_structured_output(response, citations)
     
@@ -166,21 +343,15 @@ def _extract_structured_output(response: str, citations: list) -> Tuple[str, Opt
         except json.JSONDecodeError:
             pass
     
-    json_start = response.rfind('{')
-    json_end = response.rfind('}')
-    
-    if json_start != -1 and json_end != -1 and json_start < json_end:
-        try:
-            json_str = response[json_start:json_end+1]
-            metadata = json.loads(json_str)
-            text_part = response[:json_start].strip()
-            
-            if citations:
-                metadata.setdefault('citations', []).extend(citations)
-            
-            return text_part, metadata
-        except json.JSONDecodeError:
-            pass
+    found = _find_trailing_json(response)
+    if found is not None:
+        json_start, metadata = found
+        text_part = response[:json_start].strip()
+        
+        if citations:
+            metadata.setdefault('citations', []).extend(citations)
+        
+        return text_part, metadata
     
     metadata = {
         "headings": [],
@@ -191,3 +362,25 @@ def _extract_structured_output(response: str, citations: list) -> Tuple[str, Opt
     }
     
     return response, metadata
+
+
+def _find_trailing_json(response: str) -> Optional[Tuple[int, Dict]]:
+    """
+    Last JSON object in the response as (start_index, parsed_object).
+    
+    Candidates are decoded with a real JSON parser from each '{', so nested
+    objects and braces inside strings or in the surrounding prose are handled.
+    """
+    decoder = json.JSONDecoder()
+    found = None
+    pos = response.find('{')
+    while pos != -1:
+        try:
+            obj, end = decoder.raw_decode(response, pos)
+        except json.JSONDecodeError:
+            pos = response.find('{', pos + 1)
+            continue
+        if isinstance(obj, dict):
+            found = (pos, obj)
+        pos = response.find('{', end)
+    return found
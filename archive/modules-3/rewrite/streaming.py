@@ -0,0 +1,128 @@
+import json
+from typing import Dict, Iterator, Optional, Tuple
+
+from .rewrite import _build_rag_prompts, _extract_structured_output, call_llm_stream
+
+FENCE_OPEN = "```json"
+FENCE_CLOSE = "```"
+
+
+class StructuredOutputParser:
+    """
+    Incremental parser for responses shaped like "<prose> ```json {...} ```".
+
+    feed() returns the prose that is safe to display so far: everything up to
+    the opening fence (holding back a partial fence at the end of the
+    buffer), plus anything after the closing fence. As soon as the closing
+    fence arrives, the JSON block is parsed into `metadata`, before the
+    stream has ended. finish() returns exactly what
+    _extract_structured_output would return for the full response.
+    """
+
+    def __init__(self):
+        self.metadata: Optional[Dict] = None
+        self._text = ""
+        self._emitted = 0
+        self._json_start: Optional[int] = None
+        self._json_end: Optional[int] = None
+
+    def feed(self, delta: str) -> str:
+        self._text += delta
+        text = self._text
+
+        if self._json_start is None:
+            start = text.find(FENCE_OPEN, max(0, self._emitted - len(FENCE_OPEN)))
+            if start == -1:
+                safe = len(text)
+                for k in range(len(FENCE_OPEN) - 1, 0, -1):
+                    if text.endswith(FENCE_OPEN[:k]):
+                        safe -= k
+                        break
+                return self._emit(safe)
+            out = self._emit(start)
+            self._json_start = start
+        else:
+            out = ""
+
+        if self._json_end is None:
+            close = text.find(FENCE_CLOSE, self._json_start + len(FENCE_OPEN))
+            if close == -1:
+                return out
+            self._json_end = close + len(FENCE_CLOSE)
+            self._emitted = self._json_end
+            try:
+                self.metadata = json.loads(text[self._json_start + len(FENCE_OPEN):close].strip())
+            except json.JSONDecodeError:
+                self.metadata = None
+
+        return out + self._emit(len(text))
+
+    def _emit(self, end: int) -> str:
+        if end <= self._emitted:
+            return ""
+        out = self._text[self._emitted:end]
+        self._emitted = end
+        return out
+
+    def finish(self, citations: Optional[list] = None) -> Tuple[str, Optional[Dict]]:
+        return _extract_structured_output(self._text, list(citations or []))
+
+
+class RewriteStream:
+    """
+    Iterable over the display text of a streamed rewrite.
+
+    After iteration, `result` holds (rewritten_text, metadata) as
+    rewrite_with_rag would return it and `stats` holds ttft / total latency.
+    `metadata` becomes available as soon as the JSON block has been received.
+    """
+
+    def __init__(self, tokens: Iterator[str], citations: list, stats: Dict):
+        self.parser = StructuredOutputParser()
+        self.stats = stats
+        self.result: Optional[Tuple[str, Optional[Dict]]] = None
+        self._tokens = tokens
+        self._citations = citations
+
+    @property
+    def metadata(self) -> Optional[Dict]:
+        if self.result is not None:
+            return self.result[1]
+        return self.parser.metadata
+
+    def __iter__(self) -> Iterator[str]:
+        for delta in self._tokens:
+            visible = self.parser.feed(delta)
+            if visible:
+                yield visible
+        self.result = self.parser.finish(self._citations)
+
+
+def rewrite_with_rag_stream(
+    text: str,
+    lang: str,
+    doc_type: str = "Document",
+    tone_path: str = "configs/tone.yaml",
+    prompts_path: str = "configs/prompts.yaml",
+    use_rag: bool = True,
+    rag_results: Optional[Dict] = None,
+    cache_mode: Optional[str] = None
+) -> RewriteStream:
+    """
+    Streaming counterpart of rewrite_with_rag.
+
+    Retrieval and prompt building happen before this returns; the LLM call
+    starts when the returned stream is iterated.
+
+    Example:
+        stream = rewrite_with_rag_stream(text, "EN")
+        for piece in stream:
+            panel.write(piece)
+        rewritten, metadata = stream.result
+    """
+    system_prompt, user_prompt, citations = _build_rag_prompts(
+        text, lang, doc_type, tone_path, prompts_path, use_rag, rag_results
+    )
+    stats: Dict = {}
+    tokens = call_llm_stream(system_prompt, user_prompt, cache_mode=cache_mode, stats=stats)
+    return RewriteStream(tokens, citations, stats)
@@ -0,0 +1,15 @@
+import importlib.util
+import os
+import sys
+
+# The package directory ("modules-3") is not a valid module name; the
+# deployments import it as `modules`, so register it under that name.
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'modules' not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        'modules', os.path.join(_ROOT, '__init__.py'), submodule_search_locations=[_ROOT]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['modules'] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,60 @@
+"""
+Regression tests for iter_chunks: a heading moved to the next chunk opens it
+together with its section body, and only "#" at the start of a line is a
+heading.
+"""
+import random
+
+import pytest
+
+from modules.rag.chunker import chunk_text, count_words, iter_chunks
+
+
+def test_heading_opens_chunk_with_its_body():
+    text = "Short intro sentence here now.\n\n## Usage notes\n" + " ".join(["word"] * 494)
+    chunks = chunk_text(text, chunk_size=500, overlap=50)
+    assert chunks[0] == "Short intro sentence here now."
+    assert chunks[1].startswith("## Usage notes\nword")
+    assert sum(c.count("Short intro") for c in chunks) == 1
+    assert all(c.strip() != "## Usage notes" for c in chunks)
+
+
+def test_hash_inside_a_line_is_not_a_heading():
+    text = "Intro. " + " ".join(["alpha"] * 20) + ". # not a heading here. " + " ".join(["beta"] * 20) + "."
+    chunks = list(iter_chunks(text, max_tokens=500, min_tokens=1))
+    assert len(chunks) == 1
+    assert "# not a heading" in chunks[0].text
+
+
+def test_hash_at_line_start_is_a_heading():
+    text = " ".join(["alpha"] * 30) + ".\n   # Real heading\n" + " ".join(["beta"] * 30) + "."
+    chunks = list(iter_chunks(text, max_tokens=500, min_tokens=10))
+    assert [c.text.split()[0] for c in chunks] == ["alpha", "#"]
+
+
+def _random_document(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randrange(1, 12)):
+        kind = rng.random()
+        if kind < 0.25:
+            parts.append("\n\n" + "#" * rng.randrange(1, 4) + " Section " + str(rng.randrange(100)) + "\n")
+        elif kind < 0.4:
+            parts.append(" ".join(["long"] * rng.randrange(1, 1200)) + ". ")
+        else:
+            parts.append(" ".join(["w%d" % rng.randrange(50) for _ in range(rng.randrange(1, 60))]) + ". ")
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("max_tokens,overlap", [(50, 10), (120, 30), (500, 50)])
+def test_chunks_respect_budget_and_never_repeat(max_tokens, overlap):
+    rng = random.Random(21 + max_tokens)
+    for _ in range(300):
+        text = _random_document(rng)
+        chunks = list(iter_chunks(text, max_tokens=max_tokens, overlap=overlap))
+        for prev, chunk in zip(chunks, chunks[1:]):
+            assert not (prev.start <= chunk.start and chunk.end <= prev.end), (text, prev, chunk)
+            assert chunk.end > prev.end
+        for chunk in chunks:
+            assert count_words(text, chunk.start, chunk.end) <= max_tokens
+            assert not (chunk.text.lstrip().startswith("#") and "\n" not in chunk.text.strip()
+                        and chunk is not chunks[-1]), (text, chunk)
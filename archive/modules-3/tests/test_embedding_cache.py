@@ -0,0 +1,52 @@
+"""
+Two EmbeddingCache instances on one directory stand in for two worker
+processes sharing the cache: each must see the other's rows and never hand
+out a slot the other one is using.
+"""
+import zlib
+
+import numpy as np
+
+from modules.dedupe.embedding_cache import EmbeddingCache
+
+
+def _encode(texts):
+    return np.array([[zlib.crc32(t.encode('utf-8')) % 997, len(t)] for t in texts], dtype=np.float32)
+
+
+def test_shared_directory_keeps_vectors_consistent(tmp_path):
+    a = EmbeddingCache('model', cache_dir=str(tmp_path), max_entries=50)
+    b = EmbeddingCache('model', cache_dir=str(tmp_path), max_entries=50)
+    for i in range(40):
+        for cache in (a, b):
+            texts = [f"text {(i * 7 + j * (3 if cache is a else 5)) % 120}" for j in range(6)]
+            assert np.array_equal(cache.get_or_compute(texts, _encode), _encode(texts))
+
+    fresh = EmbeddingCache('model', cache_dir=str(tmp_path), max_entries=50)
+    texts = [f"text {i}" for i in range(120)]
+    assert np.array_equal(fresh.get_or_compute(texts, _encode), _encode(texts))
+
+
+def test_other_instance_sees_new_rows_without_encoding(tmp_path):
+    a = EmbeddingCache('model', cache_dir=str(tmp_path))
+    b = EmbeddingCache('model', cache_dir=str(tmp_path))
+    a.get_or_compute(["shared text"], _encode)
+
+    def fail(texts):
+        raise AssertionError(f"re-encoded {texts}")
+
+    assert np.array_equal(b.get_or_compute(["shared text"], fail), _encode(["shared text"]))
+
+
+def test_hit_only_batches_persist_lru_ticks(tmp_path):
+    cache = EmbeddingCache('model', cache_dir=str(tmp_path), max_entries=10)
+    cache.get_or_compute([f"old {i}" for i in range(5)], _encode)
+    cache.get_or_compute([f"new {i}" for i in range(5)], _encode)
+    cache.get_or_compute(["old 0"], _encode)
+
+    # A new process evicts by the refreshed tick: "old 0" outlives "old 1".."old 4".
+    reopened = EmbeddingCache('model', cache_dir=str(tmp_path), max_entries=10)
+    reopened.get_or_compute([f"more {i}" for i in range(2)], _encode)
+    reopened.get_or_compute(["old 0"], _encode)
+    reopened.get_or_compute(["old 1"], _encode)
+    assert (reopened.hits, reopened.misses) == (1, 3)
@@ -0,0 +1,47 @@
+"""
+The fast path only calls AR/EN/DE; other Latin-script languages must be left
+to the langdetect fallback instead of being labeled DE or EN, even when they
+share function words or umlauts with German.
+"""
+import pytest
+
+from modules.utils.lang_detect import LanguageDetector, _fast_path
+
+FAST = {
+    'EN': "This beard oil is made for daily use and keeps the skin soft. Apply a few drops "
+          "after shaving and massage them into the beard; the formula will not leave any residue.",
+    'DE': "Dieses Bartöl ist für die tägliche Pflege und macht die Haut weich. Einige Tropfen "
+          "nach der Rasur auftragen und in den Bart einmassieren, es hinterlässt keine Rückstände.",
+    'AR': "زيت اللحية هذا مخصص للعناية اليومية ويجعل البشرة ناعمة. ضع بضع قطرات بعد الحلاقة.",
+}
+
+OTHER = {
+    'es': "Es una crema para la barba y es muy suave. Es ideal para el uso diario y deja "
+          "la piel hidratada; es un producto de la casa y es fácil de aplicar en la barba.",
+    'fr': "Cette huile est faite pour la barbe et on peut l'utiliser tous les jours. Elle "
+          "nourrit la peau des hommes et des femmes, et on la trouve dans toutes les boutiques.",
+    'nl': "Deze baardolie is voor de dagelijkse verzorging en maakt de huid zacht. Die olie "
+          "is in de winkel te koop en is ook geschikt voor wie een gevoelige huid heeft.",
+    'pt': "Este óleo para barba é das melhores opções para o cuidado diário das peles "
+          "sensíveis e deixa a pele macia depois das lâminas de barbear.",
+    'sv': "Skäggoljan är gjord för daglig vård och gör huden mjuk. Några droppar efter "
+          "rakningen räcker för att skägget ska kännas mjukt hela dagen.",
+    'tr': "Bu sakal yağı günlük bakım için üretildi ve cildi yumuşak tutar. Tıraştan sonra "
+          "birkaç damla sürün ve sakalınıza masaj yapın; ürün iz bırakmaz.",
+}
+
+
+@pytest.mark.parametrize("lang,text", FAST.items())
+def test_fast_path_calls_routed_languages(lang, text):
+    assert _fast_path(text)[0] == lang
+
+
+@pytest.mark.parametrize("lang,text", OTHER.items())
+def test_other_latin_languages_go_to_fallback(lang, text):
+    assert _fast_path(text) == (None, 'ambiguous')
+
+
+@pytest.mark.parametrize("lang,text", OTHER.items())
+def test_fallback_labels_other_languages(lang, text):
+    pytest.importorskip('langdetect')
+    assert LanguageDetector().detect(text) == lang.upper()
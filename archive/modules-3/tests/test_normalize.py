@@ -0,0 +1,94 @@
+"""
+Differential test: the fused single-scan normalize_text and the streaming
+normalize_lines must give exactly the output of the original pass-by-pass
+implementation, kept below as the reference.
+"""
+import random
+import re
+from datetime import datetime
+
+import pytest
+
+from modules.normalize.normalize import normalize_lines, normalize_text
+
+
+def _reference_date_to_iso(m):
+    d, mth, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if y < 100: y += 2000
+    try:
+        return datetime(y, mth, d).strftime('%Y-%m-%d')
+    except Exception:
+        return m.group(0)
+
+
+def reference_normalize_text(s: str) -> str:
+    s = re.sub(r'[ \t]+', ' ', s)
+    s = re.sub(r'\n{3,}', '\n\n', s)
+    s = re.sub(r'\s+([,;:.%])', r'\1', s)
+    s = re.sub(r'(?<=\d),(?=\d)', '.', s)
+    s = re.sub(r'\s*%', '%', s)
+    s = re.sub(r'\b(\d{1,2})[\-/](\d{1,2})[\-/](\d{2,4})\b', _reference_date_to_iso, s)
+    return s.strip()
+
+
+CASES = [
+    "",
+    "   ",
+    "\n\n\n",
+    "plain text",
+    "Preis: 12,50 EUR , inkl. 19 % MwSt .",
+    "a  \t b\t\tc",
+    "Zeile 1\n\n\n\nZeile 2\n\n\nZeile 3",
+    "Datum 31/12/2024 und 1-2-24, ungültig 31/02/2024",
+    "12/13/2020 45/01/2020 7/7/7 07-07-2007",
+    "1 ,5 und 1, 5 und 1 , 5",
+    "Ende .\n\n\n%",
+    "x\t,\ty ;  z :\n.",
+    "٣,٤ und ٣/٤/٢٠٢٠",
+    "100%  sicher , 50 %",
+    "  führende und folgende Leerzeichen  \n",
+    "HM-0012, CN/4711; 1.000,00 €",
+]
+
+_ALPHABET = [
+    " ", "  ", "\t", "\n", "\n\n\n", "\r\n", " ",
+    ",", ";", ":", ".", "%", "-", "/",
+    "0", "1", "2", "9", "12", "31", "2024", "٣",
+    "a", "ß", "Ä", "x", "word",
+]
+
+
+def _random_corpus(count: int, seed: int = 16):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(_ALPHABET) for _ in range(rng.randrange(0, 40)))
+
+
+def _random_splits(text: str, rng: random.Random):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randrange(0, 6))))
+    pieces, prev = [], 0
+    for cut in cuts:
+        pieces.append(text[prev:cut])
+        prev = cut
+    pieces.append(text[prev:])
+    return pieces
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_cases_match_reference(text):
+    assert normalize_text(text) == reference_normalize_text(text)
+
+
+def test_random_corpus_matches_reference():
+    for text in _random_corpus(20000):
+        assert normalize_text(text) == reference_normalize_text(text), repr(text)
+
+
+def test_streaming_matches_reference():
+    rng = random.Random(1016)
+    for text in list(CASES) + list(_random_corpus(5000, seed=61)):
+        expected = reference_normalize_text(text)
+        assert "".join(normalize_lines(text.splitlines(keepends=True))) == expected, repr(text)
+        pieces = _random_splits(text, rng)
+        assert "".join(normalize_lines(pieces)) == expected, (repr(text), pieces)
+        assert "".join(normalize_lines(list(text))) == expected, repr(text)
@@ -0,0 +1,78 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher (Aho-Corasick automaton).
+
+    Finds every occurrence of every pattern in one left-to-right pass over
+    the text, so the cost is O(len(text) + matches) instead of
+    O(patterns x len(text)) for repeated `pattern in text` checks.
+    Overlapping and nested patterns (e.g. "HM-1" and "HM-10") are all
+    reported.
+
+    Args:
+        patterns: Iterable of (pattern, value) pairs; value is what a match reports
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Hashable]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Hashable]]] = [[]]
+
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(pattern), value))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        # Depth-1 states fail to the root; deeper states are filled breadth-first.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                # Inherit matches that end at the fallback state.
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, Hashable]]:
+        """Yield (start_index, value) for every occurrence, ordered by end position."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for length, value in out[node]:
+                    yield i - length + 1, value
+
+    def find_all(self, text: str) -> List[Hashable]:
+        """Distinct values whose pattern occurs in text, in order of first occurrence."""
+        seen: Set[Hashable] = set()
+        found = []
+        for _, value in sorted(self.iter_matches(text), key=lambda m: m[0]):
+            if value not in seen:
+                seen.add(value)
+                found.append(value)
+        return found
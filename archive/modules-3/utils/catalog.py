@@ -0,0 +1,240 @@
+"""
+Columnar snapshots of the catalog CSVs (Product_Master.csv, Glossary.csv).
+
+A CSV is parsed once into one .npy array per column (fixed-width unicode,
+memory-mapped on load) under export/.cache/catalog/<sha256>/. An index maps
+(path, mtime, size) to the content hash, so an unchanged file costs one
+stat() per process and a touched-but-identical file one re-hash; a changed
+file gets a new snapshot, and the snapshot it replaced is deleted unless
+another path still uses it. Within a process, load_catalog() returns the same
+CatalogSnapshot until the file's mtime or size changes.
+
+Cells are kept as the exact strings from the file: unlike pandas there is no
+numeric coercion (a CNPN column with blanks stays "1000000", not
+"1000000.0") and empty cells are "" rather than "nan".
+"""
+import csv
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are not serialized between processes
+    fcntl = None
+
+from .io_utils import _file_sha256
+
+CATALOG_CACHE_DIR = "export/.cache/catalog"
+
+_SNAPSHOT_VERSION = 1
+
+
+class CatalogSnapshot:
+    """
+    Read-only column store for one CSV.
+
+    Args:
+        path: Source CSV path
+        sha: Content hash of the CSV the snapshot was built from
+        columns: Column name -> 1-D unicode array, all of the same length
+    """
+
+    def __init__(self, path: str, sha: str, columns: Dict[str, np.ndarray]):
+        self.path = path
+        self.sha = sha
+        self.columns = columns
+        self._rows = len(next(iter(columns.values()))) if columns else 0
+        self._value_sets: Dict[str, frozenset] = {}
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def has_column(self, name: str) -> bool:
+        return name in self.columns
+
+    def column(self, name: str) -> np.ndarray:
+        """The column as a unicode array; a missing column reads as all ''."""
+        values = self.columns.get(name)
+        if values is None:
+            return np.full(self._rows, '', dtype='<U1')
+        return values
+
+    def value_set(self, name: str) -> FrozenSet[str]:
+        """Distinct non-empty values of a column (computed once per snapshot)."""
+        values = self._value_sets.get(name)
+        if values is None:
+            if name not in self.columns:
+                return frozenset()
+            values = frozenset(v for v in np.unique(self.columns[name]).tolist() if v.strip())
+            self._value_sets[name] = values
+        return values
+
+    def join_columns(self, template: List[Tuple[str, str]]) -> np.ndarray:
+        """
+        Per-row strings built as prefix1 + column1 + prefix2 + column2 + ...,
+        vectorized over all rows. `template` is a list of (prefix, column).
+        """
+        out = np.full(self._rows, '', dtype='<U1')
+        for prefix, name in template:
+            if prefix:
+                out = np.char.add(out, prefix)
+            out = np.char.add(out, self.column(name))
+        return out
+
+    def term_pairs(self, source_column: str, target_column: str) -> List[Tuple[str, str]]:
+        """(source, target) pairs, stripped, for rows where both cells are non-empty."""
+        if source_column not in self.columns or target_column not in self.columns:
+            return []
+        sources = np.char.strip(self.columns[source_column])
+        targets = np.char.strip(self.columns[target_column])
+        keep = (np.char.str_len(sources) > 0) & (np.char.str_len(targets) > 0)
+        return list(zip(sources[keep].tolist(), targets[keep].tolist()))
+
+
+def _read_csv_columns(path: str) -> Dict[str, np.ndarray]:
+    with open(path, 'r', encoding='utf-8-sig', newline='') as fp:
+        reader = csv.reader(fp)
+        header = next(reader, None)
+        if header is None:
+            return {}
+        header = [name.strip() for name in header]
+        width = len(header)
+        cells: List[List[str]] = [[] for _ in header]
+        for row in reader:
+            if not row or (len(row) == 1 and not row[0].strip()):
+                continue
+            for i in range(width):
+                cells[i].append(row[i] if i < len(row) else '')
+    return {name: np.array(values, dtype=str) if values else np.array([], dtype='<U1')
+            for name, values in zip(header, cells)}
+
+
+class _CatalogCache:
+    """Snapshot directories keyed by content hash, plus a path -> (mtime, size, sha) index."""
+
+    def __init__(self, cache_dir: str = CATALOG_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+
+    def _index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize index.json read-modify-write cycles across worker processes."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, 'index.lock'), 'a') as fp:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fp, fcntl.LOCK_UN)
+
+    def key(self, path: str, st: os.stat_result) -> str:
+        abspath = os.path.abspath(path)
+        entry = self._index().get(abspath)
+        if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return entry['sha']
+        sha = _file_sha256(path)
+        with self._locked():
+            index = self._index()
+            old = index.get(abspath)
+            index[abspath] = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'sha': sha}
+            self._write_json(self.index_path, index)
+            if old and old['sha'] != sha and all(e['sha'] != old['sha'] for e in index.values()):
+                # Processes that already memory-mapped the old snapshot keep working
+                # (the files stay alive until unmapped); new readers use `sha`.
+                shutil.rmtree(os.path.join(self.cache_dir, old['sha']), ignore_errors=True)
+        return sha
+
+    def get(self, path: str, sha: str) -> Optional[CatalogSnapshot]:
+        directory = os.path.join(self.cache_dir, sha)
+        try:
+            with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as fp:
+                meta = json.load(fp)
+            if meta.get('version') != _SNAPSHOT_VERSION:
+                return None
+            columns = {
+                name: np.load(os.path.join(directory, f"{i}.npy"), mmap_mode='r')
+                for i, name in enumerate(meta['columns'])
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        return CatalogSnapshot(path, sha, columns)
+
+    def put(self, path: str, sha: str, columns: Dict[str, np.ndarray]):
+        directory = os.path.join(self.cache_dir, sha)
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for i, values in enumerate(columns.values()):
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), values)
+        # Column names go in meta.json rather than file names (they may contain any character).
+        self._write_json(os.path.join(tmp_dir, 'meta.json'), {
+            'version': _SNAPSHOT_VERSION,
+            'source': os.path.abspath(path),
+            'columns': list(columns),
+            'rows': len(next(iter(columns.values()))) if columns else 0
+        })
+        try:
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Another process published the same snapshot first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _write_json(self, path: str, data: Dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+_loaded: Dict[str, Tuple[int, int, CatalogSnapshot]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_catalog(path: str, cache_dir: Optional[str] = None) -> CatalogSnapshot:
+    """
+    Columnar snapshot of a catalog CSV, parsed at most once per content hash.
+    When the snapshot cache cannot be written, the CSV is parsed in memory.
+
+    Raises:
+        FileNotFoundError: If the CSV does not exist
+    """
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    with _loaded_lock:
+        loaded = _loaded.get(key)
+        if loaded is not None and loaded[0] == st.st_mtime_ns and loaded[1] == st.st_size:
+            return loaded[2]
+
+    cache = _CatalogCache(cache_dir or os.getenv('CATALOG_CACHE_DIR', CATALOG_CACHE_DIR))
+    try:
+        sha = cache.key(path, st)
+        snapshot = cache.get(path, sha)
+        if snapshot is None:
+            columns = _read_csv_columns(path)
+            cache.put(path, sha, columns)
+            snapshot = CatalogSnapshot(path, sha, columns)
+            print(f"[CATALOG] Snapshot of {os.path.basename(path)}: {len(snapshot)} rows, {len(columns)} columns")
+    except OSError as e:
+        # Read-only checkout or container: parse in memory for this process.
+        os.stat(path)  # a missing CSV is still an error
+        print(f"[CATALOG] Snapshot cache unavailable ({e}); parsing {os.path.basename(path)} in memory")
+        snapshot = CatalogSnapshot(path, _file_sha256(path), _read_csv_columns(path))
+
+    with _loaded_lock:
+        _loaded[key] = (st.st_mtime_ns, st.st_size, snapshot)
+    return snapshot
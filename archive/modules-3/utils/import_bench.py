@@ -0,0 +1,149 @@
+"""
+Import-time budget check for each subpackage.
+
+Usage:
+    python -m modules.utils.import_bench
+    python -m modules.utils.import_bench --repeat 5 --json export/metrics/import_times.json
+    python -m modules.utils.import_bench --targets modules.qa.qa --budget modules.qa.qa=80
+
+Every target is imported in a fresh interpreter under `python -X importtime`
+and its cumulative import time is compared with a budget (best of --repeat
+runs, to filter out scheduler noise). A target also fails if it loads one of
+its forbidden heavy dependencies at import time, which catches a regression
+(e.g. a top-level `import torch`) independently of how fast the machine is.
+Exits with status 1 if any target fails.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+HEAVY_MODULES = (
+    'torch', 'sentence_transformers', 'transformers', 'chromadb', 'sklearn',
+    'pandas', 'pdfplumber', 'docx', 'langdetect', 'openpyxl'
+)
+# Modules with no numeric work at import time must not pull in numpy either.
+NO_NUMPY = HEAVY_MODULES + ('numpy',)
+
+# target -> (budget in ms, heavy modules it must not import)
+TARGETS: Dict[str, Tuple[float, Tuple[str, ...]]] = {
+    'modules.normalize.normalize': (60, NO_NUMPY),
+    'modules.utils.io_utils': (60, NO_NUMPY),
+    'modules.utils.lang_detect': (60, NO_NUMPY),
+    'modules.qa.qa': (120, NO_NUMPY),
+    'modules.glossary': (60, NO_NUMPY),
+    'modules.dedupe.dedupe': (250, HEAVY_MODULES),
+    'modules.dedupe.dedupe_minhash': (250, HEAVY_MODULES),
+    'modules.dedupe.dedupe_tfidf': (250, HEAVY_MODULES),
+    'modules.rag': (60, NO_NUMPY),
+    'modules.rag.numpy_store': (250, HEAVY_MODULES),
+    'modules.rewrite.rewrite': (120, NO_NUMPY),
+    'modules.export.exporter': (60, NO_NUMPY),
+    'modules.pipeline.runner': (250, HEAVY_MODULES),
+}
+
+_SNIPPET = """
+import json, sys
+import {target}
+print(json.dumps(sorted(m for m in sys.modules if '.' not in m)))
+"""
+
+
+def _parse_importtime(stderr: str, target: str) -> Tuple[Optional[float], List[Tuple[str, float]]]:
+    """Cumulative ms for `target` and (package, cumulative ms) for every top-level package it pulled in."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header row
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(parts[1]) / 1000))
+
+    # Rows are printed when an import finishes, so the target's dependencies are
+    # the rows between the previous top-level import and the target itself.
+    end = next((i for i, (name, depth, _) in enumerate(rows) if name == target and depth == 0), None)
+    if end is None:
+        return None, []
+    start = end
+    while start > 0 and rows[start - 1][1] > 0:
+        start -= 1
+    root = target.split('.')[0]
+    packages = [(name, ms) for name, _, ms in rows[start:end] if '.' not in name and name != root]
+    return rows[end][2], packages
+
+
+def measure(target: str, repeat: int = 3) -> Dict:
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=package_root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    best = None
+    for _ in range(max(1, repeat)):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _SNIPPET.format(target=target)],
+            capture_output=True, text=True, env=env
+        )
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return {'target': target, 'error': error}
+        total, packages = _parse_importtime(proc.stderr, target)
+        if best is None or (total or 0) < best['ms']:
+            best = {
+                'target': target,
+                'ms': total or 0.0,
+                'loaded': json.loads(proc.stdout.strip().splitlines()[-1]),
+                'slowest': sorted(packages, key=lambda p: -p[1])[:5]
+            }
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget', nargs='*', default=[], metavar='TARGET=MS', help='Override a budget')
+    parser.add_argument('--json', help='Also write the results to this file (for tracking over time)')
+    args = parser.parse_args()
+
+    budgets = {target: budget for target, (budget, _) in TARGETS.items()}
+    for item in args.budget:
+        target, _, ms = item.partition('=')
+        budgets[target] = float(ms)
+
+    results = []
+    failed = False
+    for target in args.targets:
+        result = measure(target, args.repeat)
+        budget = budgets.get(target)
+        forbidden = TARGETS.get(target, (None, HEAVY_MODULES))[1]
+        result['budget_ms'] = budget
+
+        if 'error' in result:
+            result['ok'] = False
+            print(f"{target:<32} ERROR {result['error']}")
+        else:
+            heavy = sorted(set(result.pop('loaded')) & set(forbidden))
+            result['heavy'] = heavy
+            result['ok'] = not heavy and (budget is None or result['ms'] <= budget)
+            slowest = ", ".join(f"{name} {ms:.0f}" for name, ms in result['slowest'][:3])
+            status = "ok" if result['ok'] else "OVER"
+            print(
+                f"{target:<32} {result['ms']:7.1f} ms / {budget or '-':>5} ms  {status:<4}  "
+                f"{'heavy: ' + ','.join(heavy) + '  ' if heavy else ''}slowest: {slowest}"
+            )
+        failed = failed or not result['ok']
+        results.append(result)
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as fp:
+            json.dump({'python': sys.version.split()[0], 'results': results}, fp, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
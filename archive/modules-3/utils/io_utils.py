@@ -1,10 +1,17 @@
 from pathlib import Path
-from typing import List, Union
-import pdfplumber, re, pandas as pd
-from docx import Document
-from langdetect import detect
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import hashlib, json, multiprocessing, os, re, signal, threading
 from unidecode import unidecode
+from .metrics import timed
 
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are not serialized between processes
+    fcntl = None
+
+@timed('read_text_any', size=lambda path: os.path.getsize(path) if os.path.exists(path) else 0)
 def read_text_any(path: Union[str, Path]) -> str:
     p = Path(path)
     if not p.exists():
@@ -18,29 +25,321 @@ def read_text_any(path: Union[str, Path]) -> str:
     return p.read_text(encoding='utf-8', errors='ignore')
 
 def read_pdf(p: Path) -> str:
+    return "\n".join(iter_pdf_pages(p))
+
+PDF_CACHE_DIR = "export/.cache/pdf_text"
+
+class _PageTimeout(BaseException):
+    # BaseException so pdfplumber/pdfminer do not wrap or swallow it.
+    pass
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+def _extract_page_range(path: str, start: int, end: int, page_timeout: Optional[float]) -> List[Tuple[str, Optional[str]]]:
+    """Worker entry point: (text, error) for pages [start, end) of one PDF."""
+    # SIGALRM only works in the main thread of a process (always true in pool workers).
+    use_alarm = bool(page_timeout) and hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
     out = []
-    with pdfplumber.open(p) as pdf:
-        for page in pdf.pages:
-            out.append(page.extract_text() or '')
-    return "\n".join(out)
+    import pdfplumber
+    try:
+        with pdfplumber.open(path) as pdf:
+            for i in range(start, end):
+                page = pdf.pages[i]
+                try:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                    out.append((page.extract_text() or '', None))
+                except _PageTimeout:
+                    out.append(('', f"page {i + 1}: timed out after {page_timeout}s"))
+                except Exception as e:
+                    out.append(('', f"page {i + 1}: {e}"))
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                    # Release the parsed page objects; long PDFs otherwise keep them all.
+                    page.close()
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+    return out
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class _PdfTextCache:
+    """
+    Extracted page text on disk, one JSON file per content hash. An index
+    maps (path, mtime, size) to the hash so unchanged files are not re-hashed.
+    """
+
+    def __init__(self, cache_dir: str = PDF_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+
+    def _index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize index.json read-modify-write cycles across worker processes."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, 'index.lock'), 'a') as fp:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fp, fcntl.LOCK_UN)
+
+    def key(self, path: str) -> str:
+        st = os.stat(path)
+        abspath = os.path.abspath(path)
+        entry = self._index().get(abspath)
+        if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return entry['sha']
+        sha = _file_sha256(path)
+        with self._locked():
+            index = self._index()
+            index[abspath] = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'sha': sha}
+            self._write(self.index_path, index)
+        return sha
+
+    def get(self, sha: str) -> Optional[List[str]]:
+        try:
+            with open(os.path.join(self.cache_dir, f"{sha}.json"), 'r', encoding='utf-8') as fp:
+                return json.load(fp)['pages']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, sha: str, pages: List[str]):
+        self._write(os.path.join(self.cache_dir, f"{sha}.json"), {'pages': pages})
+
+    def _write(self, path: str, data: Dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+def iter_pdf_pages(
+    path: Union[str, Path],
+    max_workers: Optional[int] = None,
+    pages_per_task: int = 8,
+    page_timeout: Optional[float] = 30.0,
+    use_cache: bool = True
+) -> Iterator[str]:
+    """
+    Yield the text of each PDF page, in page order, as soon as it is extracted.
+
+    Page ranges of pages_per_task pages are extracted in a process pool
+    (serially for short files, max_workers=1, or when already running inside
+    a worker process). A page that raises or exceeds page_timeout seconds
+    yields '' and is reported instead of stalling the document. Fully
+    extracted documents are cached under export/.cache/pdf_text by content
+    hash, so re-reading an unchanged PDF costs one JSON load.
+    """
+    path = str(path)
+    cache = _PdfTextCache() if use_cache else None
+    sha = cache.key(path) if cache else None
+    if cache:
+        pages = cache.get(sha)
+        if pages is not None:
+            yield from pages
+            return
+
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        n_pages = len(pdf.pages)
+    ranges = [(start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    # Nested pools (e.g. under the indexer's file-reading pool) only oversubscribe the CPU.
+    if multiprocessing.parent_process() is not None:
+        max_workers = 1
+    max_workers = min(max_workers, len(ranges))
+
+    pages, errors = [], []
+    def _emit(results):
+        for text, error in results:
+            pages.append(text)
+            if error:
+                errors.append(error)
+                print(f"[PDF] {Path(path).name} {error}")
+            yield text
+
+    if max_workers <= 1:
+        for start, end in ranges:
+            yield from _emit(_extract_page_range(path, start, end, page_timeout))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_extract_page_range, path, start, end, page_timeout) for start, end in ranges]
+            for future in futures:
+                yield from _emit(future.result())
+
+    # Only cache complete extractions, so failed pages are retried next time.
+    if cache and not errors:
+        cache.put(sha, pages)
 
 def read_docx(p: Path) -> str:
+    from docx import Document
     doc = Document(str(p))
     return "\n".join([para.text for para in doc.paragraphs])
 
-def read_table(p: Path) -> str:
-    if p.suffix.lower()=='.csv':
-        df = pd.read_csv(p)
+def read_table(p: Path, columns: Optional[List[str]] = None) -> str:
+    return "\n\n".join(iter_table_batches(p, columns=columns))
+
+TABLE_BATCH_ROWS = 5000
+
+def iter_table_batches(
+    path: Union[str, Path],
+    batch_rows: int = TABLE_BATCH_ROWS,
+    columns: Optional[List[str]] = None,
+    fmt: str = "markdown"
+) -> Iterator[str]:
+    """
+    Yield a CSV/Excel table as rendered text, batch_rows rows at a time.
+
+    CSV is read with pandas chunksize and .xlsx with openpyxl in read-only
+    mode, so neither the full table nor its full rendering is ever held in
+    memory (.xls has no streaming reader and is loaded whole, then rendered
+    in batches). Cells are rendered as they appear in the file (no numeric
+    coercion, empty cells stay empty).
+
+    Args:
+        path: .csv, .xlsx or .xls file (first sheet for workbooks)
+        batch_rows: Rows per yielded batch
+        columns: Only render these columns, in this order
+        fmt: "markdown" (each batch is a table with its own header row) or
+            "text" (one "Column: value; ..." line per row)
+    """
+    if fmt not in ("markdown", "text"):
+        raise ValueError(f"Unknown table format: {fmt}")
+    render = _markdown_rows if fmt == "markdown" else _text_rows
+    for header, rows in _iter_table_rows(Path(path), batch_rows, columns):
+        yield render(header, rows)
+
+def _iter_table_rows(p: Path, batch_rows: int, columns: Optional[List[str]]) -> Iterator[Tuple[List[str], List[List[str]]]]:
+    suffix = p.suffix.lower()
+    if suffix == '.csv':
+        import pandas as pd
+        reader = pd.read_csv(p, chunksize=batch_rows, usecols=columns, dtype=str, keep_default_na=False)
+        for df in reader:
+            if columns:
+                df = df[columns]
+            yield [str(c) for c in df.columns], df.values.tolist()
+        return
+
+    if suffix == '.xls':
+        import pandas as pd
+        df = pd.read_excel(p, usecols=columns, dtype=str).fillna('')
+        if columns:
+            df = df[columns]
+        header = [str(c) for c in df.columns]
+        for start in range(0, len(df), batch_rows):
+            yield header, df.iloc[start:start + batch_rows].values.tolist()
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(p, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [_cell_text(v) for v in next(rows, ())]
+        if columns:
+            missing = [c for c in columns if c not in header]
+            if missing:
+                raise ValueError(f"Columns not found in {p.name}: {missing}")
+            picks = [header.index(c) for c in columns]
+            header = list(columns)
+        else:
+            picks = list(range(len(header)))
+        batch = []
+        for row in rows:
+            cells = [_cell_text(row[i]) if i < len(row) else '' for i in picks]
+            if not any(cells):
+                continue
+            batch.append(cells)
+            if len(batch) >= batch_rows:
+                yield header, batch
+                batch = []
+        if batch:
+            yield header, batch
+    finally:
+        wb.close()
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _markdown_cell(value: str) -> str:
+    return value.replace('|', '\\|').replace('\r', ' ').replace('\n', ' ')
+
+def _markdown_rows(header: List[str], rows: List[List[str]]) -> str:
+    lines = ["| " + " | ".join(_markdown_cell(h) for h in header) + " |",
+             "|" + "|".join(" --- " for _ in header) + "|"]
+    lines.extend("| " + " | ".join(_markdown_cell(v) for v in row) + " |" for row in rows)
+    return "\n".join(lines)
+
+def _text_rows(header: List[str], rows: List[List[str]]) -> str:
+    return "\n".join(
+        "; ".join(f"{h}: {v}" for h, v in zip(header, row) if v.strip())
+        for row in rows
+    )
+
+def iter_text_any(path: Union[str, Path], block_chars: int = 1 << 20, **table_kwargs) -> Iterator[str]:
+    """
+    Streaming read_text_any: yields pieces whose concatenation is the
+    document text. PDFs come page by page, tables batch by batch (see
+    iter_table_batches; table_kwargs are passed through) and plain text in
+    blocks of about block_chars, so a large input is never held whole.
+    """
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"File not found: {p}")
+    suffix = p.suffix.lower()
+    if suffix == '.pdf':
+        for i, page in enumerate(iter_pdf_pages(p)):
+            yield page if i == 0 else "\n" + page
+    elif suffix in ['.docx', '.doc']:
+        yield read_docx(p)
+    elif suffix in ['.csv', '.xlsx', '.xls']:
+        for i, batch in enumerate(iter_table_batches(p, **table_kwargs)):
+            yield batch if i == 0 else "\n\n" + batch
     else:
-        df = pd.read_excel(p)
-    return df.to_markdown(index=False)
+        with open(p, 'r', encoding='utf-8', errors='ignore') as fp:
+            block, size = [], 0
+            for line in fp:
+                block.append(line)
+                size += len(line)
+                if size >= block_chars:
+                    yield "".join(block)
+                    block, size = [], 0
+            if block:
+                yield "".join(block)
 
 def detect_lang(text: str) -> str:
-    try:
-        code = detect(text[:1000])
-        return code.upper()
-    except Exception:
-        return 'EN'
+    """Language code (AR/EN/DE fast path, langdetect otherwise); see utils.lang_detect."""
+    from .lang_detect import get_language_detector
+    return get_language_detector().detect(text)
+
+def detect_langs(texts: List[str]) -> List[str]:
+    """detect_lang for many texts at once (e.g. every chunk of a document)."""
+    from .lang_detect import detect_many
+    return detect_many(texts)
 
 def chunk_text(text: str, max_chars: int = 4000) -> List[str]:
     chunks, cur = [], []
@@ -0,0 +1,165 @@
+"""
+Language detection tuned for the languages we route on (AR, EN, DE).
+
+A fast path decides from the script mix (Arabic vs Latin letters) and from
+English/German function-word counts, in pure Python with no model to load.
+Only texts it cannot call confidently (very short, mixed, or some other
+Latin-script language) go to langdetect, which is imported on first use and
+seeded so results are stable between runs. Results are memoized by a hash
+of the sampled text.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from . import metrics
+
+SAMPLE_CHARS = 1000
+DEFAULT_LANG = 'EN'
+
+_LETTERS = re.compile(r'[^\W\d_]+')
+_ARABIC = re.compile(r'[؀-ۿݐ-ݿࢠ-ࣿﭐ-﷿ﹰ-﻿]')
+_GERMAN_CHARS = re.compile(r'[äöüß]')
+
+# Function words of one language only: words shared with Dutch, French,
+# Spanish, Portuguese or the Scandinavian languages ('die', 'den', 'es', 'des',
+# 'is', 'in', 'on', 'was', ...) are left out, so a text in another Latin-script
+# language does not reach MIN_HITS and goes to langdetect.
+_STOPWORDS = {
+    'EN': frozenset((
+        'the', 'and', 'are', 'of', 'to', 'for', 'with', 'that', 'this', 'it', 'be',
+        'not', 'you', 'your', 'our', 'from', 'by', 'can', 'have', 'at', 'which',
+        'its', 'more', 'these', 'they', 'their', 'there', 'been', 'were', 'would',
+        'should', 'what', 'when', 'about', 'into', 'than', 'also'
+    )),
+    'DE': frozenset((
+        'und', 'ist', 'sind', 'nicht', 'für', 'auf', 'ein', 'eine', 'einen', 'einem',
+        'einer', 'eines', 'zu', 'von', 'sich', 'auch', 'im', 'wird', 'wurde', 'sie',
+        'wir', 'ihr', 'ihre', 'oder', 'bei', 'nach', 'aus', 'kann', 'diese', 'dieses',
+        'zum', 'zur', 'dass', 'nur', 'noch', 'wenn', 'durch', 'sehr', 'haben', 'ich',
+        'uns', 'ohne', 'über', 'kein', 'keine'
+    )),
+}
+
+# Fast-path thresholds
+ARABIC_RATIO = 0.5   # share of letters in Arabic script to call AR
+MIN_HITS = 3         # function words needed before trusting the EN/DE vote
+MARGIN = 2.0         # winner must have at least MARGIN x the loser's hits
+
+
+def _sample_key(sample: str) -> bytes:
+    return hashlib.blake2b(sample.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def _fast_path(sample: str) -> Tuple[Optional[str], str]:
+    """(language or None if ambiguous, path label for metrics)."""
+    words = _LETTERS.findall(sample.lower())
+    letters = sum(len(w) for w in words)
+    if not letters:
+        return DEFAULT_LANG, 'empty'
+
+    arabic = len(_ARABIC.findall(sample))
+    if arabic / letters >= ARABIC_RATIO:
+        return 'AR', 'script'
+    if arabic:
+        return None, 'mixed'
+
+    en = sum(1 for w in words if w in _STOPWORDS['EN'])
+    de_words = sum(1 for w in words if w in _STOPWORDS['DE'])
+    # Umlauts and ß also occur in Swedish, Finnish or Turkish: they only
+    # strengthen a vote that has German function words behind it.
+    de = de_words + len(_GERMAN_CHARS.findall(sample))
+    if en + de >= MIN_HITS:
+        if en >= MARGIN * de:
+            return 'EN', 'stopwords'
+        if de_words and de >= MARGIN * en:
+            return 'DE', 'stopwords'
+    return None, 'ambiguous'
+
+
+class LanguageDetector:
+    """
+    Memoizing AR/EN/DE detector with a langdetect fallback.
+
+    Args:
+        max_entries: Size of the LRU memo (keyed by a hash of the sample)
+        fallback: Send ambiguous texts to langdetect; if False (or langdetect
+            is not installed) they get DEFAULT_LANG
+    """
+
+    def __init__(self, max_entries: int = 65536, fallback: bool = True):
+        self.max_entries = max_entries
+        self.fallback = fallback
+        self._memo: 'OrderedDict[bytes, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._detect = None
+
+    def _slow_path(self, sample: str) -> str:
+        if not self.fallback:
+            return DEFAULT_LANG
+        if self._detect is None:
+            try:
+                from langdetect import DetectorFactory, detect
+            except ImportError:
+                self.fallback = False
+                return DEFAULT_LANG
+            DetectorFactory.seed = 0
+            self._detect = detect
+        try:
+            return self._detect(sample).upper()
+        except Exception:
+            return DEFAULT_LANG
+
+    def detect(self, text: str) -> str:
+        return self.detect_many([text])[0]
+
+    def detect_many(self, texts: Iterable[str]) -> List[str]:
+        """Language code per text, in order; duplicate texts are detected once."""
+        samples = [(text or '')[:SAMPLE_CHARS] for text in texts]
+        keys = [_sample_key(sample) for sample in samples]
+        results: List[Optional[str]] = [None] * len(samples)
+
+        todo = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                code = self._memo.get(key)
+                if code is not None:
+                    self._memo.move_to_end(key)
+                    results[i] = code
+                    metrics.inc('lang_detect_total', 1, {'path': 'memo'})
+                else:
+                    todo.setdefault(key, []).append(i)
+
+        for key, rows in todo.items():
+            sample = samples[rows[0]]
+            code, path = _fast_path(sample)
+            if code is None:
+                code, path = self._slow_path(sample), 'langdetect'
+            metrics.inc('lang_detect_total', len(rows), {'path': path})
+            for i in rows:
+                results[i] = code
+
+        with self._lock:
+            for key, rows in todo.items():
+                self._memo[key] = results[rows[0]]
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return results
+
+
+_detector: Optional[LanguageDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_language_detector() -> LanguageDetector:
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = LanguageDetector()
+        return _detector
+
+
+def detect_many(texts: Iterable[str]) -> List[str]:
+    return get_language_detector().detect_many(texts)
@@ -0,0 +1,295 @@
+"""
+Lightweight metrics for the pipeline stages.
+
+Disabled unless METRICS_ENABLED=true (or enable() is called); a disabled
+@timed function costs one flag check per call. When enabled, every stage
+records a latency histogram (pipeline_stage_seconds{stage=...}) and,
+where it makes sense, an input-size histogram (pipeline_stage_size), and
+modules add their own counters (e.g. llm_tokens_total). Export with
+export_prometheus() (text exposition format, e.g. for the node exporter
+textfile collector) or export_json(); with METRICS_EXPORT=<path> the
+registry is written at interpreter exit.
+
+METRICS_PROFILE=read_text_any,call_llm (or "all") additionally runs those
+stages under cProfile and dumps the accumulated stats to
+export/metrics/profiles/<stage>.<pid>.prof (view with `python -m pstats`).
+"""
+import atexit
+import cProfile
+import functools
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+SIZE_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, math.inf)
+PROFILE_DIR = "export/metrics/profiles"
+
+_enabled = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+_profile_stages = {s.strip() for s in os.getenv('METRICS_PROFILE', '').split(',') if s.strip()}
+_lock = threading.Lock()
+_local = threading.local()
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict:
+        return {
+            'buckets': [b if b != math.inf else '+Inf' for b in self.buckets],
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    def merge(self, data: Dict):
+        for i, c in enumerate(data['counts']):
+            self.counts[i] += c
+        self.count += data['count']
+        self.sum += data['sum']
+        if data['count']:
+            self.min = min(self.min, data['min'])
+            self.max = max(self.max, data['max'])
+
+
+_histograms: Dict[Key, Histogram] = {}
+_counters: Dict[Key, float] = {}
+_profiles: Dict[str, cProfile.Profile] = {}
+
+
+def _key(name: str, labels: Optional[Dict[str, str]]) -> Key:
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(profile: Optional[Iterable[str]] = None):
+    """Turn metrics on for this process (and, via the environment, for child processes)."""
+    global _enabled
+    _enabled = True
+    os.environ['METRICS_ENABLED'] = 'true'
+    if profile:
+        _profile_stages.update(profile)
+        os.environ['METRICS_PROFILE'] = ",".join(sorted(_profile_stages))
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    os.environ['METRICS_ENABLED'] = 'false'
+
+
+def observe(name: str, value: float, labels: Optional[Dict[str, str]] = None):
+    """Add a value to a histogram; names ending in _seconds use latency buckets."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(LATENCY_BUCKETS if name.endswith('_seconds') else SIZE_BUCKETS)
+        hist.observe(value)
+
+
+def inc(name: str, value: float = 1, labels: Optional[Dict[str, str]] = None):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def stage(name: str, size: Optional[float] = None):
+    """Time a block as pipeline stage `name` (optionally recording an input size)."""
+    if not _enabled:
+        yield
+        return
+    profiler = _start_profile(name)
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        _stop_profile(name, profiler)
+        observe('pipeline_stage_seconds', elapsed, {'stage': name})
+        if size is not None:
+            observe('pipeline_stage_size', size, {'stage': name})
+        if error:
+            inc('pipeline_stage_errors_total', 1, {'stage': name})
+
+
+def timed(name: str, size: Optional[Callable[..., float]] = None):
+    """
+    Decorator form of stage(). `size` is called with the function's
+    arguments and returns the input size to record (e.g. len(text)).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with stage(name, size(*args, **kwargs) if size is not None else None):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _start_profile(name: str) -> Optional[cProfile.Profile]:
+    # Only one profiler can be active per thread; nested stages are covered by the outer one.
+    if not _profile_stages or getattr(_local, 'profiling', False):
+        return None
+    if name not in _profile_stages and 'all' not in _profile_stages:
+        return None
+    with _lock:
+        profiler = _profiles.setdefault(name, cProfile.Profile())
+    _local.profiling = True
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already running in this thread.
+        _local.profiling = False
+        return None
+    return profiler
+
+
+def _stop_profile(name: str, profiler: Optional[cProfile.Profile]):
+    if profiler is None:
+        return
+    profiler.disable()
+    _local.profiling = False
+    Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}.{os.getpid()}.prof"))
+
+
+def snapshot(reset: bool = False) -> Dict:
+    """JSON-serializable copy of the registry (used to ship worker-process metrics to the parent)."""
+    with _lock:
+        data = {
+            'histograms': [
+                {'name': name, 'labels': dict(labels), **hist.to_dict()}
+                for (name, labels), hist in _histograms.items()
+            ],
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in _counters.items()
+            ]
+        }
+        if reset:
+            _histograms.clear()
+            _counters.clear()
+    return data
+
+
+def merge(data: Optional[Dict]):
+    """Add a snapshot (e.g. from a worker process) into this process's registry."""
+    if not data:
+        return
+    with _lock:
+        for item in data['histograms']:
+            key = _key(item['name'], item['labels'])
+            hist = _histograms.get(key)
+            if hist is None:
+                buckets = tuple(math.inf if b == '+Inf' else b for b in item['buckets'])
+                hist = _histograms[key] = Histogram(buckets)
+            hist.merge(item)
+        for item in data['counters']:
+            key = _key(item['name'], item['labels'])
+            _counters[key] = _counters.get(key, 0) + item['value']
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+def export_prometheus(path: str):
+    """Write the registry in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+    typed = set()
+    for item in sorted(data['histograms'], key=lambda h: (h['name'], sorted(h['labels'].items()))):
+        name, labels = item['name'], item['labels']
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(item['buckets'], item['counts']):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {item['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {item['count']}")
+    for item in sorted(data['counters'], key=lambda c: (c['name'], sorted(c['labels'].items()))):
+        name = item['name']
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(item['labels'])} {item['value']}")
+    _write(path, "\n".join(lines) + "\n")
+
+
+def export_json(path: str):
+    _write(path, json.dumps(snapshot(), indent=2))
+
+
+def export(path: str):
+    """Export to `path`, as JSON if it ends in .json and Prometheus text otherwise."""
+    if path.endswith('.json'):
+        export_json(path)
+    else:
+        export_prometheus(path)
+    print(f"[METRICS] Wrote {path}")
+
+
+def _write(path: str, content: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fp:
+        fp.write(content)
+    os.replace(tmp_path, path)
+
+
+def _export_at_exit():
+    path = os.getenv('METRICS_EXPORT')
+    # Worker processes ship snapshots to their parent instead of overwriting the file.
+    if multiprocessing.parent_process() is not None:
+        return
+    if _enabled and path and (_histograms or _counters):
+        export(path)
+
+
+atexit.register(_export_at_exit)